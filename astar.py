@@ -1,24 +1,50 @@
 """An A* implementation."""
 
 from abc import ABCMeta, abstractmethod
+from array import array
+import collections
+import contextlib
+from dataclasses import dataclass
 import heapq
 import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import signal
+import sys
+import threading
 import time
-from typing import Iterator, Tuple
+from typing import Iterator, Optional, Tuple
+
+import pytest
+
+from util import peak_rss
 
 
 class PriorityQueue:
-    """A priority queue, with fast containment."""
+    """A priority queue, with fast containment.
+
+    Removed entries stay in the heap as dead entries until they are popped.
+    Once there are more than `compact_ratio` dead entries per live one, the
+    heap is rebuilt without them.
+    """
 
     # Basically, this as a class:
     # https://docs.python.org/3/library/heapq.html#priority-queue-implementation-notes
 
     REMOVED = object()
 
-    def __init__(self):
+    # Don't bother compacting heaps smaller than this.
+    MIN_COMPACT = 1000
+
+    def __init__(self, compact_ratio=1.0):
         self.q = []
         self.counter = itertools.count()
         self.items = {}
+        self.dead = 0
+        self.compact_ratio = compact_ratio
 
     def __len__(self):
         return len(self.items)
@@ -36,6 +62,15 @@ class PriorityQueue:
     def remove(self, item):
         entry = self.items.pop(item)
         entry[2] = self.REMOVED
+        self.dead += 1
+        if self.dead > self.MIN_COMPACT and self.dead > len(self.items) * self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """Rebuild the heap without its dead entries."""
+        self.q[:] = [entry for entry in self.q if entry[2] is not self.REMOVED]
+        heapq.heapify(self.q)
+        self.dead = 0
 
     def pop(self):
         while self.q:
@@ -43,8 +78,117 @@ class PriorityQueue:
             if item is not self.REMOVED:
                 del self.items[item]
                 return item
+            self.dead -= 1
         raise IndexError("Pop from empty priority queue")
 
+    def peek(self):
+        """Return (priority, item) for the item .pop() would return next."""
+        while self.q and self.q[0][2] is self.REMOVED:
+            heapq.heappop(self.q)
+            self.dead -= 1
+        if not self.q:
+            raise IndexError("Peek at empty priority queue")
+        priority, _, item = self.q[0]
+        return priority, item
+
+    def lowest_priority(self):
+        """A lower bound for the priorities in the queue, without changing it."""
+        return self.q[0][0] if self.q else None
+
+    def entries(self):
+        """Produce (item, priority) for each live item, in no particular order."""
+        for item, entry in self.items.items():
+            yield item, entry[0]
+
+    def empty(self):
+        return not self.items
+
+
+class BucketQueue:
+    """A priority queue for small non-negative integer priorities.
+
+    Items are kept in a bucket per priority, so add, remove and pop are all
+    O(1), with no dead entries left behind.  Pops are fastest when priorities
+    never go below the last one popped, as with A* and a consistent heuristic.
+
+    Only integer priorities can be used: AStar uses a PriorityQueue unless
+    it's asked for this.
+    """
+
+    # Buckets never hold dead entries.
+    dead = 0
+
+    # How far to step the cursor before looking for the lowest bucket instead.
+    MAX_STEPS = 16
+
+    def __init__(self):
+        self.buckets = {}
+        self.items = {}
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def add(self, item, priority):
+        if type(priority) is not int:
+            raise TypeError(f"BucketQueue needs integer priorities, not {priority!r}")
+        if item in self.items:
+            self.remove(item)
+        self.items[item] = priority
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = {}
+        bucket[item] = None
+        if priority < self.cursor:
+            self.cursor = priority
+
+    def remove(self, item):
+        priority = self.items.pop(item)
+        bucket = self.buckets[priority]
+        del bucket[item]
+        if not bucket:
+            del self.buckets[priority]
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("Pop from empty priority queue")
+        self.advance()
+        bucket = self.buckets[self.cursor]
+        item, _ = bucket.popitem()
+        if not bucket:
+            del self.buckets[self.cursor]
+        del self.items[item]
+        return item
+
+    def peek(self):
+        """Return (priority, item) for the item .pop() would return next."""
+        if not self.items:
+            raise IndexError("Peek at empty priority queue")
+        self.advance()
+        return self.cursor, next(reversed(self.buckets[self.cursor]))
+
+    def advance(self):
+        """Move the cursor up to the lowest non-empty bucket."""
+        buckets = self.buckets
+        for _ in range(self.MAX_STEPS):
+            if self.cursor in buckets:
+                return
+            self.cursor += 1
+        # Priorities are widely spaced: don't step through all the gaps.
+        if self.cursor not in buckets:
+            self.cursor = min(buckets)
+
+    def lowest_priority(self):
+        """A lower bound for the priorities in the queue, without changing it."""
+        return self.cursor if self.items else None
+
+    def entries(self):
+        """Produce (item, priority) for each live item, in no particular order."""
+        return iter(self.items.items())
+
     def empty(self):
         return not self.items
 
@@ -76,26 +220,248 @@ class State(metaclass=ABCMeta):
         """A short summary of the state, for progress logging."""
         return ""
 
+    def fingerprint(self):
+        """Something picklable that tells this state from others, in any problem.
 
-class OnceEvery:
-    """An object whose .now() method is true once every N seconds."""
-    def __init__(self, seconds):
-        self.delta = seconds
-        self.last_true = 0
+        Checkpoints keep their start state's fingerprint, so a search isn't
+        resumed from a checkpoint for a different problem.  States that are
+        equal in different problems should override this.
+        """
+        return self
 
-    def now(self):
-        ret = time.time() > self.last_true + self.delta
-        if ret:
-            self.last_true = time.time()
-        return ret
+    # These are only needed for BidirectionalAStar.
 
+    def goal_state(self) -> 'State':
+        """The goal state to search back from."""
+        raise NotImplementedError
 
-class AStar:
-    def __init__(self):
-        self.candidates = PriorityQueue()
+    def prev_states(self, cost) -> Iterator[Tuple['State', float]]:
+        """Produce a series of previous states: (prev_state, new_cost), ...
+
+        Getting from prev_state to this state costs new_cost - cost.
+        """
+        raise NotImplementedError
+
+    def guess_start_cost(self, start) -> float:
+        """Guess at the cost to get here from `start`. Must not overestimate."""
+        return 0
+
+
+class PackedProblem(metaclass=ABCMeta):
+    """Abstract interface for a problem for PackedAStar.
+
+    States are packed into small non-negative ints, which are used as indexes
+    into arrays, so they should be densely packed.  Costs must be ints.
+    """
+
+    @abstractmethod
+    def start(self) -> int:
+        """The packed start state."""
+
+    @abstractmethod
+    def is_goal(self, state: int) -> bool:
+        """Is this state a goal state? Are we done?"""
+
+    @abstractmethod
+    def next_states(self, state: int, cost: int) -> Iterator[Tuple[int, int]]:
+        """Produce a series of next states: (new_state, new_cost), ... """
+
+    @abstractmethod
+    def guess_completion_cost(self, state: int) -> int:
+        """Guess at the cost to reach the goal. Must not overestimate."""
+
+    def summary(self, state: int) -> str:
+        """A short summary of the state, for progress logging."""
+        return ""
+
+
+@dataclass
+class SearchStats:
+    """A snapshot of how a search is going, for `on_stats` callbacks."""
+    elapsed: float                  # Seconds since the search started.
+    expansions: int                 # States expanded so far.
+    expansions_per_sec: float       # Since the last snapshot.
+    candidates: int                 # Live entries in the candidate queues.
+    dead: int                       # Dead entries in the candidate queues.
+    improved: int                   # Times a state already found got a cheaper cost.
+    cost: Optional[float]           # Cost to the state being expanded.
+    f_cost: Optional[float]         # Lowest candidate priority.
+    f_growth: Optional[float]       # How far f_cost is above the start's guess.
+    peak_rss: int                   # Peak resident memory, in bytes.
+    summary: str                    # The state being expanded.
+    done: bool = False              # Is this the final snapshot?
+
+    def __str__(self):
+        counts = (
+            f"{self.expansions:,d} visited ({self.expansions_per_sec:,.0f}/s), "
+            f"{self.candidates:,d} candidates ({self.dead:,d} dead), "
+            f"{self.improved:,d} cheaper paths found, peak memory {self.peak_rss/1e6:.1f}Mb"
+            )
+        if self.done:
+            return f"At end: {counts}"
+        return f"cost {self.cost}; f {self.f_cost} (+{self.f_growth}); {counts}, {self.summary}"
+
+
+class Sampler:
+    """A context manager to call `callback(frame)` every `seconds` of CPU time.
+
+    In the main thread, this uses the SIGPROF interval timer, like a sampling
+    profiler, so the code being sampled doesn't check anything: when nothing
+    is sampled, nothing is slowed down.  It can't be used while a real
+    profiler is using SIGPROF.
+
+    Signals only go to the main thread, so in other threads .polling is true,
+    and the code being sampled has to call .poll() as it goes.  Every
+    POLL_EVERY calls, it checks the thread's CPU time.
+    """
+
+    SIGNAL = signal.SIGPROF
+    TIMER = signal.ITIMER_PROF
+    CLOCK = time.thread_time
+
+    POLL_EVERY = 1000
+
+    def __init__(self, seconds, callback):
+        self.seconds = seconds
+        self.callback = callback
+        self.old_handler = None
+        self.polling = False
+
+    def handler(self, signum, frame):
+        self.callback(frame)
+
+    def __enter__(self):
+        self.polling = threading.current_thread() is not threading.main_thread()
+        if self.polling:
+            self.polls = 0
+            self.due = self.CLOCK() + self.seconds
+        else:
+            self.old_handler = signal.signal(self.SIGNAL, self.handler)
+            signal.setitimer(self.TIMER, self.seconds, self.seconds)
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.polling:
+            signal.setitimer(self.TIMER, 0)
+            signal.signal(self.SIGNAL, self.old_handler)
+
+    def poll(self):
+        """Call the callback with the caller's frame, if it's time to."""
+        self.polls += 1
+        if self.polls >= self.POLL_EVERY:
+            self.polls = 0
+            now = self.CLOCK()
+            if now >= self.due:
+                self.due = now + self.seconds
+                self.callback(sys._getframe(1))
+
+
+class Alarm(Sampler):
+    """Like Sampler, but every `seconds` of wall-clock time, using SIGALRM."""
+
+    SIGNAL = signal.SIGALRM
+    TIMER = signal.ITIMER_REAL
+    CLOCK = time.monotonic
+
+
+def pollers(*timers):
+    """The .poll methods of those `timers` that need polling."""
+    return [timer.poll for timer in timers if getattr(timer, "polling", False)]
+
+
+class InstrumentedSearch:
+    """Stats reporting shared by the search classes.
+
+    Subclasses provide .expansions(), .queues(), and .describe(state), count
+    in .improved the times a state already found gets a cheaper cost, and set
+    .start_f when they start.  Stats are sampled from a timer, so the search
+    loops don't pay for them.
+    """
+
+    improved = 0
+    start_f = None
+
+    # The method whose frame has the loop's locals.
+    search_loop = "search"
+
+    def sampling(self, log_every, on_stats):
+        """A context manager to report stats every `log_every` seconds of CPU time.
+
+        `on_stats` is called with a SearchStats, and defaults to print.  The
+        search loop should call the functions from `pollers()` of what it
+        returns on each expansion.
+        """
+        self.on_stats = on_stats or print
+        self.started = self.last_sample = time.perf_counter()
+        self.last_expansions = 0
+        if log_every:
+            return Sampler(log_every, self.sample)
+        return contextlib.nullcontext()
+
+    def sample(self, frame):
+        # Find the search loop's frame, to see what it's working on.
+        code = getattr(type(self), self.search_loop).__code__
+        while frame is not None and frame.f_code is not code:
+            frame = frame.f_back
+        if frame is not None:
+            self.on_stats(self.stats(frame.f_locals))
+
+    def stats(self, loop_locals=None, done=False):
+        """Make a SearchStats for the search so far."""
+        now = time.perf_counter()
+        expansions = self.expansions()
+        rate = (expansions - self.last_expansions) / max(now - self.last_sample, 1e-9)
+        self.last_sample, self.last_expansions = now, expansions
+        queues = [q for q in self.queues() if q is not None]
+        f_cost = min((q.lowest_priority() for q in queues if len(q)), default=None)
+        if f_cost is not None and self.start_f is not None:
+            f_growth = f_cost - self.start_f
+        else:
+            f_growth = None
+        loop_locals = loop_locals or {}
+        best = loop_locals.get("best")
+        return SearchStats(
+            elapsed=now - self.started,
+            expansions=expansions,
+            expansions_per_sec=rate,
+            candidates=sum(len(q) for q in queues),
+            dead=sum(q.dead for q in queues),
+            improved=self.improved,
+            cost=loop_locals.get("cost"),
+            f_cost=f_cost,
+            f_growth=f_growth,
+            peak_rss=peak_rss(),
+            summary=self.describe(best) if best is not None else "",
+            done=done,
+            )
+
+
+class AStar(InstrumentedSearch):
+    """A* search.
+
+    `queue_class` is the priority queue to use for candidates, PriorityQueue
+    by default.  BucketQueue can be faster, but only if all costs are ints.
+
+    If `keep_path` is false, predecessors aren't recorded, which saves memory,
+    but .path() can't be used.
+
+    A search can be saved to a checkpoint file as it runs, and picked up
+    again later with AStar.resume().
+    """
+
+    search_loop = "run"
+
+    # Bump this when the checkpoint contents change.
+    CHECKPOINT_VERSION = 3
+
+    def __init__(self, queue_class=None, keep_path=True):
+        self.queue_class = queue_class
+        self.candidates = None
         self.costs = {}
         self.visited = set()
-        self.came_from = {}
+        self.came_from = {} if keep_path else None
+        self.goal = None
+        self.alarmed = False
 
     def add_candidate(self, state, cost):
         guess = state.guess_completion_cost()
@@ -103,38 +469,948 @@ class AStar:
         self.costs[state] = cost
         self.candidates.add(state, cost + guess)
 
-    def search(self, start_state, log_every=0):
+    def expansions(self):
+        return len(self.visited)
+
+    def queues(self):
+        return [self.candidates]
+
+    def describe(self, state):
+        return state.summary()
+
+    def search(self, start_state, log_every=0, on_stats=None, checkpoint=None, checkpoint_every=60):
+        """Search from `start_state`, returning the cost to reach the goal.
+
+        If `log_every` is non-zero, stats are sampled every `log_every`
+        seconds of CPU time, and passed to `on_stats` (print by default).
+
+        If `checkpoint` is a file name, the search is saved there every
+        `checkpoint_every` seconds.
+        """
+        self.start(start_state)
+        return self.run(log_every, on_stats, checkpoint, checkpoint_every)
+
+    def start(self, start_state):
+        """Get ready to search from `start_state`."""
+        queue_class = self.queue_class or PriorityQueue
+        self.candidates = queue_class()
+        self.add_candidate(start_state, 0)
+        self.start_f = start_state.guess_completion_cost()
+        self.start_fingerprint = start_state.fingerprint()
+        if self.came_from is not None:
+            self.came_from[start_state] = None
+
+    def run(self, log_every=0, on_stats=None, checkpoint=None, checkpoint_every=60, run_for=None):
+        """Carry on with a started or resumed search, returning the cost to reach the goal.
+
+        `log_every` and `on_stats` are as for .search().  If `checkpoint` is a
+        file name, the search is saved there every `checkpoint_every`
+        seconds.  If `run_for` is given, the search stops after about that
+        many seconds, saving a checkpoint if it has a file, and returns None.
+        Calling .run() again carries on from there.
+        """
         inf = float('inf')
-        if log_every:
-            should_log = OnceEvery(seconds=log_every)
+        came_from = self.came_from
+        deadline = None if run_for is None else time.monotonic() + run_for
+        intervals = [t for t in [checkpoint and checkpoint_every, run_for] if t]
+        if intervals:
+            alarm = Alarm(min(intervals), self.alarm)
         else:
-            should_log = None
+            alarm = contextlib.nullcontext()
+        with self.sampling(log_every, on_stats) as sampler, alarm:
+            polls = pollers(sampler, alarm)
+            try:
+                while True:
+                    for poll in polls:
+                        poll()
+                    if self.alarmed:
+                        if checkpoint:
+                            self.save(checkpoint)
+                        # Alarms while saving don't count, or saving could take all the time.
+                        self.alarmed = False
+                        if deadline is not None and time.monotonic() >= deadline:
+                            return None
+                    try:
+                        best = self.candidates.pop()
+                    except IndexError:
+                        raise Exception("No solution") from None
+                    cost = self.costs[best]
+                    if best.is_goal():
+                        self.goal = best
+                        return cost
+                    self.visited.add(best)
+                    for nstate, ncost in best.next_states(cost):
+                        if nstate in self.visited:
+                            continue
+                        old_cost = self.costs.get(nstate, inf)
+                        if ncost < old_cost:
+                            if old_cost != inf:
+                                self.improved += 1
+                            self.add_candidate(nstate, ncost)
+                            if came_from is not None:
+                                came_from[nstate] = best
+            finally:
+                if log_every:
+                    self.on_stats(self.stats(done=True))
+
+    def alarm(self, frame):
+        # Only set a flag: the loop saves the search when it's in a consistent state.
+        self.alarmed = True
+
+    def save(self, filename):
+        """Save the search so far to `filename`, replacing it atomically."""
+        snapshot = {
+            "version": self.CHECKPOINT_VERSION,
+            "queue_class": type(self.candidates),
+            "candidates": list(self.candidates.entries()),
+            "costs": self.costs,
+            "visited": self.visited,
+            "came_from": self.came_from,
+            "improved": self.improved,
+            "start_f": self.start_f,
+            "start_fingerprint": self.start_fingerprint,
+        }
+        temp = f"{filename}.tmp"
+        with open(temp, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, filename)
+
+    @classmethod
+    def resume(cls, filename, start_state=None):
+        """Make an AStar from a checkpoint saved by .save(), ready to .run().
+
+        If `start_state` is given, the checkpoint must be for a search from it.
+        """
+        with open(filename, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot.get("version") != cls.CHECKPOINT_VERSION:
+            raise ValueError(f"Can't resume from {filename}: it's from a different version")
+        if start_state is not None and start_state.fingerprint() != snapshot["start_fingerprint"]:
+            raise ValueError(f"Can't resume from {filename}: it's for a different start state")
+        astar = cls(snapshot["queue_class"], keep_path=snapshot["came_from"] is not None)
+        astar.candidates = snapshot["queue_class"]()
+        for state, priority in snapshot["candidates"]:
+            astar.candidates.add(state, priority)
+        astar.costs = snapshot["costs"]
+        astar.visited = snapshot["visited"]
+        astar.came_from = snapshot["came_from"]
+        astar.improved = snapshot["improved"]
+        astar.start_f = snapshot["start_f"]
+        astar.start_fingerprint = snapshot["start_fingerprint"]
+        return astar
+
+    def path(self, state=None):
+        """Produce the states on the best path to `state`, from it back to the start.
+
+        `state` defaults to the goal found by the last search.
+        """
+        if self.came_from is None:
+            raise ValueError("Path wasn't kept, use keep_path=True")
+        if state is None:
+            state = self.goal
+        while state is not None:
+            yield state
+            state = self.came_from[state]
+
+
+class PackedAStar(InstrumentedSearch):
+    """A* search over a PackedProblem.
+
+    Costs, visited flags, and predecessors are kept in arrays indexed by the
+    packed state, which take a handful of bytes per state instead of the
+    hundreds that dicts of State objects need.
+
+    If `keep_path` is false, predecessors aren't recorded, and .path() can't
+    be used.
+    """
+
+    # The cost of a state we haven't reached yet.
+    UNKNOWN = 2**63 - 1
+
+    def __init__(self, queue_class=None, keep_path=True):
+        self.queue_class = queue_class or BucketQueue
+        self.candidates = None
+        self.costs = array("q")
+        self.visited = bytearray()
+        self.came_from = array("q") if keep_path else None
+        self.goal = None
+
+    def grow(self, state):
+        """Make the arrays big enough to hold `state`."""
+        size = max(state + 1, 2 * len(self.visited), 1024)
+        more = size - len(self.visited)
+        # These extend the arrays in place, so references to them stay good.
+        self.costs += array("q", [self.UNKNOWN]) * more
+        if self.came_from is not None:
+            self.came_from += array("q", [-1]) * more
+        self.visited += bytes(more)
+
+    def expansions(self):
+        return self.visited.count(1)
+
+    def queues(self):
+        return [self.candidates]
+
+    def describe(self, state):
+        return self.problem.summary(state)
+
+    def search(self, problem, log_every=0, on_stats=None):
+        """Search `problem`, returning the cost to reach the goal.
+
+        If `log_every` is non-zero, stats are sampled every `log_every`
+        seconds of CPU time, and passed to `on_stats` (print by default).
+        """
+        self.problem = problem
+        self.candidates = candidates = self.queue_class()
+        costs = self.costs
+        visited = self.visited
+        came_from = self.came_from
+        guess = problem.guess_completion_cost
+
+        start = problem.start()
+        if start >= len(visited):
+            self.grow(start)
+        costs[start] = 0
+        candidates.add(start, guess(start))
+        self.start_f = guess(start)
+        with self.sampling(log_every, on_stats) as sampler:
+            polls = pollers(sampler)
+            try:
+                while True:
+                    for poll in polls:
+                        poll()
+                    try:
+                        best = candidates.pop()
+                    except IndexError:
+                        raise Exception("No solution") from None
+                    cost = costs[best]
+                    if problem.is_goal(best):
+                        self.goal = best
+                        return cost
+                    visited[best] = 1
+                    for nstate, ncost in problem.next_states(best, cost):
+                        if nstate >= len(visited):
+                            self.grow(nstate)
+                        elif visited[nstate]:
+                            continue
+                        old_cost = costs[nstate]
+                        if ncost < old_cost:
+                            if old_cost != self.UNKNOWN:
+                                self.improved += 1
+                            costs[nstate] = ncost
+                            candidates.add(nstate, ncost + guess(nstate))
+                            if came_from is not None:
+                                came_from[nstate] = best
+            finally:
+                if log_every:
+                    self.on_stats(self.stats(done=True))
+
+    def path(self, state=None):
+        """Produce the packed states on the best path to `state`, from it back to the start.
+
+        `state` defaults to the goal found by the last search.
+        """
+        if self.came_from is None:
+            raise ValueError("Path wasn't kept, use keep_path=True")
+        if state is None:
+            state = self.goal
+        while state != -1:
+            yield state
+            state = self.came_from[state]
+
+
+class SearchSide:
+    """One direction of a BidirectionalAStar search.
+
+    States can be expanded before their best cost is known, so they are
+    re-opened if a cheaper way to them turns up.
+    """
+    def __init__(self, queue_class, start_state, next_states, guess):
+        self.candidates = queue_class()
+        self.costs = {start_state: 0}
+        self.visited = set()
+        self.next_states = next_states
+        self.guess = guess
         self.add_candidate(start_state, 0)
-        self.came_from[start_state] = None
-        try:
-            while True:
-                try:
-                    best = self.candidates.pop()
-                except IndexError:
-                    raise Exception("No solution") from None
-                cost = self.costs[best]
+
+    def add_candidate(self, state, cost):
+        self.costs[state] = cost
+        self.candidates.add(state, max(cost + self.guess(state), 2 * cost))
+
+
+class BidirectionalAStar(InstrumentedSearch):
+    """A* search forward from the start and backward from the goal at once.
+
+    States must implement .goal_state() and .prev_states(), and can implement
+    .guess_start_cost() as the heuristic for the backward side.
+
+    This is the MM algorithm (Holte et al., 2016): candidates are prioritized
+    by max(f, 2g), so neither side searches much past the middle, and the side
+    with the lower priority is expanded next.  The best meeting cost is optimal
+    once no candidate on either side has a lower priority.
+
+    It's only worth it when the heuristic is weak.  On day 22's caves, it
+    expands more states than AStar: `python day22.py bench` compares them.
+    """
+    def __init__(self, queue_class=None):
+        self.queue_class = queue_class
+        self.forward = None
+        self.backward = None
+
+    def expansions(self):
+        return len(self.forward.visited) + len(self.backward.visited)
+
+    def queues(self):
+        return [self.forward.candidates, self.backward.candidates]
+
+    def describe(self, state):
+        return state.summary()
+
+    def search(self, start_state, log_every=0, on_stats=None):
+        """Search from `start_state`, returning the cost to reach the goal.
+
+        If `log_every` is non-zero, stats are sampled every `log_every`
+        seconds of CPU time, and passed to `on_stats` (print by default).
+        """
+        inf = float('inf')
+        goal_state = start_state.goal_state()
+        queue_class = self.queue_class or PriorityQueue
+        self.forward = forward = SearchSide(
+            queue_class, start_state,
+            lambda state, cost: state.next_states(cost),
+            lambda state: state.guess_completion_cost(),
+        )
+        self.backward = backward = SearchSide(
+            queue_class, goal_state,
+            lambda state, cost: state.prev_states(cost),
+            lambda state: state.guess_start_cost(start_state),
+        )
+        self.start_f = forward.candidates.peek()[0]
+        best_cost = 0 if start_state == goal_state else inf
+        with self.sampling(log_every, on_stats) as sampler:
+            polls = pollers(sampler)
+            try:
+                while forward.candidates and backward.candidates:
+                    for poll in polls:
+                        poll()
+                    fpri = forward.candidates.peek()[0]
+                    bpri = backward.candidates.peek()[0]
+                    if min(fpri, bpri) >= best_cost:
+                        break
+                    if fpri <= bpri:
+                        side, other = forward, backward
+                    else:
+                        side, other = backward, forward
+                    best = side.candidates.pop()
+                    cost = side.costs[best]
+                    side.visited.add(best)
+                    for nstate, ncost in side.next_states(best, cost):
+                        old_cost = side.costs.get(nstate, inf)
+                        if ncost < old_cost:
+                            if old_cost != inf:
+                                self.improved += 1
+                            side.visited.discard(nstate)
+                            side.add_candidate(nstate, ncost)
+                            other_cost = other.costs.get(nstate)
+                            if other_cost is not None and ncost + other_cost < best_cost:
+                                best_cost = ncost + other_cost
+                if best_cost == inf:
+                    raise Exception("No solution")
+                return best_cost
+            finally:
+                if log_every:
+                    self.on_stats(self.stats(done=True))
+
+class IDAStar:
+    """Iterative-deepening A*.
+
+    Depth-first searches are run with a growing limit on f, keeping only the
+    current path.  To avoid re-exploring states reached more than one way, a
+    table of the best costs seen in an iteration is kept, but only up to
+    `max_states` entries: when it fills up, it's emptied and starts over, so
+    memory stays bounded and the search just repeats more work.
+    """
+    def __init__(self, max_states=1_000_000):
+        self.max_states = max_states
+        self.expansions = 0
+        self.iterations = 0
+
+    def search(self, start_state):
+        inf = float('inf')
+        limit = start_state.guess_completion_cost()
+        while True:
+            self.iterations += 1
+            next_limit = inf
+            best_costs = {start_state: 0}
+            on_path = {start_state}
+            stack = [(start_state, 0, start_state.next_states(0))]
+            if start_state.is_goal():
+                return 0
+            while stack:
+                state, cost, nexts = stack[-1]
+                for nstate, ncost in nexts:
+                    if nstate in on_path or ncost >= best_costs.get(nstate, inf):
+                        continue
+                    f = ncost + nstate.guess_completion_cost()
+                    if f > limit:
+                        next_limit = min(next_limit, f)
+                        continue
+                    if nstate.is_goal():
+                        return ncost
+                    if len(best_costs) >= self.max_states:
+                        best_costs.clear()
+                    best_costs[nstate] = ncost
+                    self.expansions += 1
+                    on_path.add(nstate)
+                    stack.append((nstate, ncost, nstate.next_states(ncost)))
+                    break
+                else:
+                    stack.pop()
+                    on_path.discard(state)
+            if next_limit == inf:
+                raise Exception("No solution")
+            limit = next_limit
+
+
+class SMAStar:
+    """Simplified memory-bounded A* (Russell, 1992).
+
+    This is A*, but with at most `max_states` states in memory.  The
+    candidate with the lowest f, deepest first among ties, is expanded, which
+    works out a lower bound on f for each of its successors, and then brings
+    in its successors one at a time, best first.  When memory is full, the
+    leaf with the highest f, shallowest first, is forgotten, and its f goes
+    back to its parent as the bound for regenerating it if it's needed.
+
+    f values never go down: a successor's f is at least its parent's, and an
+    expanded state's f is backed up from its successors'.  Paths longer than
+    `max_states` states can't be kept, so states that deep get no successors,
+    and an infinite f.  If every way on is a dead end or too deep, the search
+    fails with "No solution" instead of running out of memory.
+    """
+    def __init__(self, max_states=1_000_000):
+        self.max_states = max_states
+        self.candidates = PriorityQueue()
+        self.leaves = PriorityQueue()
+        self.costs = {}
+        self.fs = {}
+        self.depths = {}
+        self.came_from = {}
+        self.slots = {}             # Which of its parent's successors a state is.
+        self.children = {}
+        self.bounds = {}            # Expanded state: f of each successor not in memory.
+        self.expansions = 0
+        self.evictions = 0
+
+    def add_state(self, state, cost, f, parent=None, slot=None):
+        self.costs[state] = cost
+        self.fs[state] = f
+        self.came_from[state] = parent
+        self.slots[state] = slot
+        self.children[state] = set()
+        if parent is None:
+            self.depths[state] = 0
+        else:
+            self.depths[state] = self.depths[parent] + 1
+            self.children[parent].add(state)
+            self.bounds[parent][slot] = None
+            self.requeue(parent)
+        self.requeue(state)
+
+    def requeue(self, state):
+        """Put `state` in the queues it belongs in, with up-to-date priorities."""
+        depth = self.depths[state]
+        bounds = self.bounds.get(state)
+        if bounds is None:
+            f = self.fs[state]
+        else:
+            f = min((b for b in bounds if b is not None), default=float('inf'))
+        if f < float('inf'):
+            self.candidates.add(state, (f, -depth))
+        elif state in self.candidates:
+            self.candidates.remove(state)
+        if self.children[state] or self.came_from[state] is None:
+            if state in self.leaves:
+                self.leaves.remove(state)
+        else:
+            self.leaves.add(state, (-self.fs[state], depth))
+
+    def backup(self, state):
+        """Work out `state`'s f again from its successors', and on up the tree."""
+        while state is not None:
+            f = min(
+                itertools.chain(
+                    (self.fs[child] for child in self.children[state]),
+                    (b for b in self.bounds[state] if b is not None),
+                ),
+                default=float('inf'),
+            )
+            if f == self.fs[state]:
+                break
+            self.fs[state] = f
+            self.requeue(state)
+            state = self.came_from[state]
+
+    def forget(self, state):
+        del self.costs[state]
+        del self.fs[state]
+        del self.depths[state]
+        del self.came_from[state]
+        del self.slots[state]
+        del self.children[state]
+        self.bounds.pop(state, None)
+        if state in self.candidates:
+            self.candidates.remove(state)
+        if state in self.leaves:
+            self.leaves.remove(state)
+
+    def drop(self, state):
+        """Forget `state` and everything below it, for good."""
+        parent = self.came_from[state]
+        slot = self.slots[state]
+        stack = [state]
+        while stack:
+            dropped = stack.pop()
+            stack.extend(self.children[dropped])
+            self.forget(dropped)
+        self.children[parent].discard(state)
+        self.bounds[parent][slot] = float('inf')
+        self.requeue(parent)
+        self.backup(parent)
+
+    def evict(self):
+        """Forget the worst leaf, remembering its f in its parent."""
+        leaf = self.leaves.pop()
+        parent = self.came_from[leaf]
+        self.bounds[parent][self.slots[leaf]] = self.fs[leaf]
+        self.forget(leaf)
+        self.children[parent].discard(leaf)
+        self.requeue(parent)
+        self.evictions += 1
+
+    def expand(self, state):
+        self.expansions += 1
+        f = self.fs[state]
+        if self.depths[state] + 1 < self.max_states:
+            self.bounds[state] = [
+                max(f, ncost + nstate.guess_completion_cost())
+                for nstate, ncost in state.next_states(self.costs[state])
+            ]
+        else:
+            # The path is too long to keep in memory.
+            self.bounds[state] = []
+        self.requeue(state)
+        self.backup(state)
+
+    def generate(self, state, slot):
+        """Bring successor number `slot` of `state` into memory."""
+        bounds = self.bounds[state]
+        nstate, ncost = next(itertools.islice(state.next_states(self.costs[state]), slot, None))
+        if nstate in self.costs:
+            if self.costs[nstate] <= ncost:
+                # There's already as good a way there.
+                bounds[slot] = float('inf')
+                self.requeue(state)
+                self.backup(state)
+                return
+            # A cheaper way to a state we know: start it over from here.
+            self.drop(nstate)
+        self.add_state(nstate, ncost, bounds[slot], state, slot)
+        while len(self.costs) > self.max_states:
+            self.evict()
+
+    def search(self, start_state):
+        self.add_state(start_state, 0, start_state.guess_completion_cost())
+        while True:
+            try:
+                (f, _), best = self.candidates.peek()
+            except IndexError:
+                # Every way on is a dead end, or too deep to keep in memory.
+                raise Exception("No solution") from None
+            bounds = self.bounds.get(best)
+            if bounds is None:
                 if best.is_goal():
-                    return cost
-                if should_log and should_log.now():
-                    print(f"cost {cost}; {len(self.visited):,d} visited, {len(self.candidates):,d} candidates, {best.summary()}")
-                self.visited.add(best)
-                for nstate, ncost in best.next_states(cost):
-                    if nstate in self.visited:
+                    return self.costs[best]
+                self.expand(best)
+            else:
+                self.generate(best, bounds.index(f))
+
+
+def hda_owner(state, workers):
+    """Which of `workers` workers owns packed `state`?"""
+    # Knuth's multiplicative hash, using the high bits to pick the worker.
+    return ((state * 2654435761) & 0xFFFFFFFF) * workers >> 32
+
+
+def hda_worker(problem, me, inboxes, incumbent, sent, received, idle, expansions, stop, batch_size):
+    """The body of one ParallelAStar worker process."""
+    unknown = PackedAStar.UNKNOWN
+    workers = len(inboxes)
+    inbox = inboxes[me]
+    candidates = BucketQueue()
+    costs = {}
+    guess = problem.guess_completion_cost
+    outboxes = [array("q") for _ in range(workers)]
+    expanded = 0
+
+    def take(message):
+        """Add the (state, cost) pairs in `message` to our candidates."""
+        pairs = array("q")
+        pairs.frombytes(message)
+        for i in range(0, len(pairs), 2):
+            state, cost = pairs[i], pairs[i+1]
+            if cost < costs.get(state, unknown):
+                costs[state] = cost
+                candidates.add(state, cost + guess(state))
+
+    def send(owner):
+        sent[me] += 1
+        inboxes[owner].put(outboxes[owner].tobytes())
+        del outboxes[owner][:]
+
+    while not stop.is_set():
+        # Take in what other workers have sent us.
+        while True:
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                break
+            idle[me] = 0
+            take(message)
+            received[me] += 1
+
+        best_cost = incumbent.value
+        if candidates and candidates.peek()[0] < best_cost:
+            # Expand a few states before looking at the inbox again.
+            for _ in range(batch_size):
+                if not candidates or candidates.peek()[0] >= best_cost:
+                    break
+                best = candidates.pop()
+                cost = costs[best]
+                expanded += 1
+                if problem.is_goal(best):
+                    with incumbent.get_lock():
+                        if cost < incumbent.value:
+                            incumbent.value = cost
+                    best_cost = incumbent.value
+                    continue
+                for nstate, ncost in problem.next_states(best, cost):
+                    if ncost + guess(nstate) >= best_cost:
                         continue
-                    old_cost = self.costs.get(nstate, inf)
-                    if ncost < old_cost:
-                        self.add_candidate(nstate, ncost)
-                        self.came_from[nstate] = best
+                    owner = hda_owner(nstate, workers)
+                    if owner == me:
+                        if ncost < costs.get(nstate, unknown):
+                            costs[nstate] = ncost
+                            candidates.add(nstate, ncost + guess(nstate))
+                    else:
+                        outbox = outboxes[owner]
+                        outbox.append(nstate)
+                        outbox.append(ncost)
+                        if len(outbox) >= 2 * batch_size:
+                            send(owner)
+        else:
+            # Nothing worth doing here: flush what we have, and wait for more.
+            flushed = False
+            for owner, outbox in enumerate(outboxes):
+                if outbox:
+                    send(owner)
+                    flushed = True
+            if not flushed:
+                expansions[me] = expanded
+                idle[me] = 1
+                try:
+                    message = inbox.get(timeout=0.01)
+                except queue.Empty:
+                    continue
+                idle[me] = 0
+                take(message)
+                received[me] += 1
+
+    expansions[me] = expanded
+
+
+class ParallelAStar:
+    """Hash-distributed A* (HDA*, Kishimoto et al., 2009) over a PackedProblem.
+
+    Each packed state is owned by one of `workers` processes, chosen by
+    hashing the state.  Workers expand their own best candidates, and send
+    successors owned by others in batches of `batch_size` through
+    multiprocessing queues.  States are re-opened if a cheaper cost arrives
+    later, so the answer is still optimal for an admissible guess.
+
+    The search is over when every worker is idle, and the counts of batches
+    sent and received agree and haven't changed since the last look.
+
+    Workers are forked, so the problem doesn't need to be picklable.
+    """
+
+    def __init__(self, workers=None, batch_size=256):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.expansions = None
+
+    def search(self, problem):
+        ctx = multiprocessing.get_context("fork")
+        workers = self.workers
+        inboxes = [ctx.Queue() for _ in range(workers)]
+        incumbent = ctx.Value("q", PackedAStar.UNKNOWN)
+        sent = ctx.Array("q", workers, lock=False)
+        received = ctx.Array("q", workers, lock=False)
+        idle = ctx.Array("b", workers, lock=False)
+        expansions = ctx.Array("q", workers, lock=False)
+        stop = ctx.Event()
+
+        start = problem.start()
+        owner = hda_owner(start, workers)
+        sent[owner] += 1
+        inboxes[owner].put(array("q", [start, 0]).tobytes())
+
+        procs = [
+            ctx.Process(
+                target=hda_worker,
+                args=(problem, me, inboxes, incumbent, sent, received, idle, expansions, stop, self.batch_size),
+                daemon=True,
+            )
+            for me in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        try:
+            last_look = None
+            while True:
+                time.sleep(0.005)
+                if any(proc.exitcode not in (None, 0) for proc in procs):
+                    raise Exception("A search worker failed")
+                look = (all(idle), sum(sent), sum(received))
+                if look[0] and look[1] == look[2] and look == last_look:
+                    break
+                last_look = look
         finally:
-            if log_every:
-                print(f"At end: {len(self.visited):,d} visited, {len(self.candidates):,d} candidates remaining")
+            stop.set()
+            for proc in procs:
+                proc.join(timeout=1)
+                if proc.is_alive():
+                    proc.terminate()
+            self.expansions = list(expansions)
+
+        if incumbent.value == PackedAStar.UNKNOWN:
+            raise Exception("No solution")
+        return incumbent.value
+
+
+def search(start_state, log=False, queue_class=None, on_stats=None, checkpoint=None, checkpoint_every=60):
+    """Search a state space, starting with `start_state`. Returns the cost to reach the goal.
+
+    If `checkpoint` is a file name, the search is saved there every
+    `checkpoint_every` seconds, and if the file already exists, the search
+    resumes from it instead of starting again.  The checkpoint must be from
+    a search from `start_state`, and is deleted once the goal is found.
+    """
+    if checkpoint and os.path.exists(checkpoint):
+        astar = AStar.resume(checkpoint, start_state)
+    else:
+        astar = AStar(queue_class, keep_path=False)
+        astar.start(start_state)
+    cost = astar.run(log, on_stats, checkpoint, checkpoint_every)
+    if checkpoint:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(checkpoint)
+    return cost
+
+
+def search_path(start_state, log=False, queue_class=None):
+    """Search a state space, starting with `start_state`.
+
+    Returns the cost to reach the goal, and an iterator of the states on the
+    path, from the goal back to `start_state`.
+    """
+    astar = AStar(queue_class)
+    cost = astar.search(start_state, log)
+    return cost, astar.path()
 
 
-def search(start_state, log=False):
-    """Search a state space, starting with `start_state`. Returns the cost to reach the goal."""
-    return AStar().search(start_state, log)
+def search_bidirectional(start_state, log=False, queue_class=None):
+    """Search a state space from `start_state` and its goal state. Returns the cost to reach the goal."""
+    return BidirectionalAStar(queue_class).search(start_state, log)
+
+
+def search_packed(problem, log=False, queue_class=None, on_stats=None):
+    """Search a PackedProblem. Returns the cost to reach the goal."""
+    return PackedAStar(queue_class, keep_path=False).search(problem, log, on_stats)
+
+
+def search_ida(start_state, max_states=1_000_000):
+    """Search a state space with IDA*, remembering at most `max_states` states. Returns the cost to reach the goal."""
+    return IDAStar(max_states).search(start_state)
+
+
+def search_sma(start_state, max_states=1_000_000):
+    """Search a state space with SMA*, remembering at most `max_states` states. Returns the cost to reach the goal."""
+    return SMAStar(max_states).search(start_state)
+
+
+def search_parallel(problem, workers=None):
+    """Search a PackedProblem with several processes. Returns the cost to reach the goal."""
+    return ParallelAStar(workers).search(problem)
+
+
+def test_bucket_queue():
+    q = BucketQueue()
+    q.add("a", 5)
+    q.add("b", 3)
+    q.add("c", 7)
+    q.add("c", 4)
+    assert len(q) == 3
+    assert "c" in q
+    assert [q.pop(), q.pop(), q.pop()] == ["b", "c", "a"]
+    assert q.empty()
+
+def test_priority_queue_compaction():
+    q = PriorityQueue(compact_ratio=0.5)
+    q.MIN_COMPACT = 10
+    for i in range(20):
+        q.add(i, i)
+    for i in range(15):
+        q.add(i, i + 100)
+    # The 11th re-add tipped the dead count over the limit.
+    assert q.dead == 4
+    assert len(q.q) == 24
+    assert len(q) == 20
+    assert [q.pop() for _ in range(20)] == list(range(15, 20)) + list(range(15))
+    assert q.dead == 0
+    assert q.empty()
+
+@pytest.mark.parametrize("queue_class", [PriorityQueue, BucketQueue])
+def test_peek(queue_class):
+    q = queue_class()
+    q.add("a", 5)
+    q.add("b", 3)
+    q.add("b", 6)
+    assert q.peek() == (5, "a")
+    assert q.pop() == "a"
+    assert q.peek() == (6, "b")
+    q.pop()
+    with pytest.raises(IndexError):
+        q.peek()
+
+def test_sampler():
+    frames = []
+    with Sampler(0.001, frames.append):
+        end = time.process_time() + 2
+        while not frames and time.process_time() < end:
+            pass
+    assert frames
+    assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)
+
+def test_sampler_in_thread():
+    # Signals can't be used, so the sampled code polls.
+    frames = []
+    def sampled():
+        with Sampler(0.001, frames.append) as sampler:
+            assert sampler.polling
+            end = time.process_time() + 2
+            while not frames and time.process_time() < end:
+                sampler.poll()
+    thread = threading.Thread(target=sampled)
+    thread.start()
+    thread.join()
+    assert frames
+    assert frames[0].f_code is sampled.__code__
+
+def test_hda_owner():
+    owners = collections.Counter(hda_owner(state, 4) for state in range(10000))
+    assert sorted(owners) == [0, 1, 2, 3]
+    assert min(owners.values()) > 2000
+
+class GraphState(State):
+    """A node in a graph given as {node: {neighbor: cost, ...}}, for tests."""
+    def __init__(self, graph, node, goal, guess=0):
+        self.graph = graph
+        self.node = node
+        self.goal = goal
+        self.guess = guess
+
+    def __hash__(self):
+        return hash(self.node)
+
+    def __eq__(self, other):
+        return self.node == other.node
+
+    def is_goal(self):
+        return self.node == self.goal
+
+    def next_states(self, cost):
+        for node, step in self.graph[self.node].items():
+            yield self.__class__(self.graph, node, self.goal, self.guess), cost + step
+
+    def guess_completion_cost(self):
+        return 0 if self.is_goal() else self.guess
+
+def test_float_costs():
+    # An integer guess doesn't mean the costs are integers.
+    graph = {"a": {"b": 0.5, "c": 2}, "b": {"c": 1}, "c": {}}
+    assert search(GraphState(graph, "a", "c")) == 1.5
+    assert search_path(GraphState(graph, "a", "c"))[0] == 1.5
+
+@pytest.mark.parametrize("queue_class", [None, PriorityQueue, BucketQueue])
+def test_large_costs(queue_class):
+    # BucketQueue doesn't step through all the empty buckets: see test_bucket_queue_gaps.
+    graph = {"a": {"b": 10**7}, "b": {"c": 10**7, "d": 1}, "c": {"d": 10**7}, "d": {}}
+    assert search(GraphState(graph, "a", "d"), queue_class=queue_class) == 10**7 + 1
+    assert search(GraphState(graph, "a", "c"), queue_class=queue_class) == 2 * 10**7
+
+def test_bucket_queue_gaps():
+    q = BucketQueue()
+    q.add("a", 10**9)
+    q.add("b", 5)
+    assert q.pop() == "b"
+    # The cursor steps a little way, then jumps straight to the next bucket.
+    steps = []
+    class Watched(dict):
+        def __contains__(self, priority):
+            steps.append(priority)
+            return super().__contains__(priority)
+    q.buckets = Watched(q.buckets)
+    assert q.peek() == (10**9, "a")
+    assert q.cursor == 10**9
+    assert len(steps) <= BucketQueue.MAX_STEPS + 2
+    assert q.pop() == "a"
+
+def random_graph(rand, size):
+    graph = {node: {} for node in range(size)}
+    for _ in range(rand.randint(size, 3 * size)):
+        a, b = rand.randrange(size), rand.randrange(size)
+        if a != b:
+            graph[a][b] = rand.randint(1, 9)
+    return graph
+
+def test_sma_tight_memory():
+    # With memory for the states on a best path, SMA* finds it, and with less,
+    # it finds a worse path or fails, but it always finishes.
+    rand = random.Random(1992)
+    for _ in range(300):
+        size = rand.randint(2, 20)
+        graph = random_graph(rand, size)
+        max_states = rand.randint(2, 12)
+        try:
+            best = search(GraphState(graph, 0, size - 1))
+        except Exception:
+            best = None
+        try:
+            cost = SMAStar(max_states).search(GraphState(graph, 0, size - 1))
+        except Exception as exc:
+            assert str(exc) == "No solution"
+            cost = None
+        if best is None:
+            assert cost is None
+            continue
+        # Costs scaled up, plus one per step, make the cheapest path the one
+        # with the fewest states among the best paths.
+        steps = {a: {b: step * 1000 + 1 for b, step in edges.items()} for a, edges in graph.items()}
+        fewest_states = search(GraphState(steps, 0, size - 1)) % 1000 + 1
+        if fewest_states <= max_states:
+            assert cost == best
+        else:
+            assert cost is None or cost > best
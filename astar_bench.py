@@ -0,0 +1,298 @@
+"""Benchmarks for astar.py, on synthetic grid problems and day 22 caves.
+
+    python astar_bench.py [RESULTS.json]        # run the benchmarks
+    python astar_bench.py compare OLD.json NEW.json
+
+Results are written as JSON, so runs from different commits can be compared.
+Comparing reports any benchmark whose expansion rate dropped, or whose peak
+memory grew, by more than 10%, and exits with status 1 if there were any.
+"""
+
+from dataclasses import asdict, dataclass
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+from astar import AStar, BucketQueue, PriorityQueue, State
+from day22 import Cave, CaveState
+
+
+class Grid:
+    """A rectangular grid to get across, from the top left to the bottom right.
+
+    `walls` is a set of (x, y) that can't be entered.  `weights`, if given, is
+    a list of rows of the cost to enter each square, otherwise it costs 1.
+    """
+    def __init__(self, width, height, walls=(), weights=None):
+        self.width = width
+        self.height = height
+        self.walls = set(walls)
+        self.weights = weights
+
+class GridState(State):
+    def __init__(self, grid, x=0, y=0):
+        self.grid = grid
+        self.x = x
+        self.y = y
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __eq__(self, other):
+        return (self.x, self.y) == (other.x, other.y)
+
+    def is_goal(self):
+        return self.x == self.grid.width - 1 and self.y == self.grid.height - 1
+
+    def guess_completion_cost(self):
+        # Every square costs at least 1 to enter.
+        return (self.grid.width - 1 - self.x) + (self.grid.height - 1 - self.y)
+
+    def summary(self):
+        return f"at {(self.x, self.y)}"
+
+    def next_states(self, cost):
+        grid = self.grid
+        for nx, ny in [(self.x-1, self.y), (self.x, self.y-1), (self.x+1, self.y), (self.x, self.y+1)]:
+            if 0 <= nx < grid.width and 0 <= ny < grid.height and (nx, ny) not in grid.walls:
+                step = grid.weights[ny][nx] if grid.weights else 1
+                yield self.__class__(grid, nx, ny), cost + step
+
+def open_grid(size):
+    return Grid(size, size)
+
+def maze(size, seed=0):
+    """A maze with one path between any two squares, made by a random depth-first walk.
+
+    Passages are on the even squares, so `size` should be odd.
+    """
+    rand = random.Random(seed)
+    walls = {(x, y) for x in range(size) for y in range(size)}
+    walls.discard((0, 0))
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        unvisited = [
+            (nx, ny) for nx, ny in [(x-2, y), (x, y-2), (x+2, y), (x, y+2)]
+            if (nx, ny) in walls and nx % 2 == 0 and ny % 2 == 0
+            ]
+        if unvisited:
+            nx, ny = rand.choice(unvisited)
+            walls.discard(((x + nx) // 2, (y + ny) // 2))
+            walls.discard((nx, ny))
+            stack.append((nx, ny))
+        else:
+            stack.pop()
+    return Grid(size, size, walls)
+
+def weighted_grid(size, seed=0):
+    rand = random.Random(seed)
+    weights = [[rand.randint(1, 9) for _ in range(size)] for _ in range(size)]
+    return Grid(size, size, weights=weights)
+
+def problems(scale=1):
+    """Produce (name, make_start_state) for each benchmark problem.
+
+    `scale` multiplies the problem sizes.
+    """
+    for size in [200, 400]:
+        size *= scale
+        yield f"open {size}", lambda size=size: GridState(open_grid(size))
+        yield f"maze {size+1}", lambda size=size: GridState(maze(size + 1))
+        yield f"weighted {size}", lambda size=size: GridState(weighted_grid(size))
+    for ty in [100, 300, 785]:
+        ty *= scale
+        yield f"cave {ty}", lambda ty=ty: CaveState(Cave(4080, 14, ty))
+
+QUEUES = [PriorityQueue, BucketQueue]
+
+
+@dataclass
+class BenchResult:
+    """How one search went, for one problem with one queue class."""
+    problem: str
+    queue: str
+    cost: int
+    seconds: float                  # Best time of the timed runs.
+    expansions: int                 # States expanded.
+    expansions_per_sec: float
+    candidates: int                 # Live queue entries left at the end.
+    dead: int                       # Dead queue entries left at the end.
+    improved: int                   # Times a state already found got a cheaper cost.
+    peak_candidates: int            # Most live queue entries at once.
+    peak_memory: int                # Peak memory allocated during the search, in bytes.
+
+    def __str__(self):
+        return (
+            f"{self.problem:>12s} {self.queue:>13s}: cost {self.cost}, {self.seconds:.3f}s, "
+            f"{self.expansions:,d} visited ({self.expansions_per_sec:,.0f}/s), "
+            f"{self.peak_candidates:,d} peak candidates ({self.dead:,d} dead at end), "
+            f"{self.improved:,d} cheaper paths found, peak memory {self.peak_memory/1e6:.1f}Mb"
+            )
+
+def peak_tracking(queue_class):
+    """Make a subclass of `queue_class` that records its largest size in .peak."""
+    class PeakTracking(queue_class):
+        peak = 0
+
+        def add(self, item, priority):
+            super().add(item, priority)
+            if len(self.items) > self.peak:
+                self.peak = len(self.items)
+    return PeakTracking
+
+def measure(name, make_state, queue_class, repeat=3):
+    """Search `make_state()` with `queue_class`, returning a BenchResult.
+
+    The search is timed `repeat` times, and the best time is kept.  Memory and
+    peak queue size are measured in one more run, since tracing memory slows
+    the search down.
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start_state = make_state()
+        astar = AStar(queue_class, keep_path=False)
+        start = time.perf_counter()
+        cost = astar.search(start_state)
+        seconds = min(seconds, time.perf_counter() - start)
+    stats = astar.stats(done=True)
+
+    start_state = make_state()
+    traced = AStar(peak_tracking(queue_class), keep_path=False)
+    tracemalloc.start()
+    try:
+        traced.search(start_state)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchResult(
+        problem=name,
+        queue=queue_class.__name__,
+        cost=cost,
+        seconds=seconds,
+        expansions=stats.expansions,
+        expansions_per_sec=stats.expansions / max(seconds, 1e-9),
+        candidates=stats.candidates,
+        dead=stats.dead,
+        improved=stats.improved,
+        peak_candidates=traced.candidates.peak,
+        peak_memory=peak_memory,
+        )
+
+def run_all(scale=1, repeat=3, on_result=print):
+    """Run every problem with every queue class, returning a list of BenchResults."""
+    results = []
+    for name, make_state in problems(scale):
+        for queue_class in QUEUES:
+            result = measure(name, make_state, queue_class, repeat)
+            on_result(result)
+            results.append(result)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(filename, results):
+    data = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "results": [asdict(result) for result in results],
+    }
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=2)
+
+def load(filename):
+    with open(filename) as f:
+        data = json.load(f)
+    results = []
+    for result in data["results"]:
+        # Older results called .improved .reopens.
+        if "reopens" in result:
+            result["improved"] = result.pop("reopens")
+        results.append(BenchResult(**result))
+    return results
+
+def compare(old, new, threshold=0.10):
+    """Compare two lists of BenchResults, returning descriptions of regressions.
+
+    It's a regression if the expansion rate is more than `threshold` lower, or
+    the peak memory more than `threshold` higher.  Benchmarks in only one of
+    the lists are ignored.
+    """
+    regressions = []
+    old = {(r.problem, r.queue): r for r in old}
+    for r in new:
+        was = old.get((r.problem, r.queue))
+        if was is None:
+            continue
+        what = f"{r.problem} with {r.queue}"
+        if r.cost != was.cost:
+            regressions.append(f"{what}: cost changed from {was.cost} to {r.cost}")
+        if r.expansions_per_sec < was.expansions_per_sec * (1 - threshold):
+            regressions.append(
+                f"{what}: {r.expansions_per_sec:,.0f} expansions/s, was {was.expansions_per_sec:,.0f}"
+                )
+        if r.peak_memory > was.peak_memory * (1 + threshold):
+            regressions.append(
+                f"{what}: peak memory {r.peak_memory/1e6:.1f}Mb, was {was.peak_memory/1e6:.1f}Mb"
+                )
+    return regressions
+
+
+@pytest.mark.parametrize("queue_class", QUEUES)
+def test_grids(queue_class):
+    def cost(grid):
+        return AStar(queue_class).search(GridState(grid))
+    assert cost(open_grid(20)) == 38
+    assert cost(Grid(3, 3, walls=[(1, 0), (1, 1)])) == 4
+    assert cost(Grid(2, 2, weights=[[1, 5], [1, 1]])) == 2
+    # There's a way through the maze, and it's longer than the straight line.
+    assert cost(maze(21)) >= 40
+    assert cost(weighted_grid(20)) >= 38
+
+def test_maze():
+    grid = maze(9, seed=1)
+    assert (0, 0) not in grid.walls
+    assert (8, 8) not in grid.walls
+    # Odd squares are always walls.
+    assert all((x, y) in grid.walls for x in range(1, 9, 2) for y in range(1, 9, 2))
+
+def test_measure_and_compare(tmp_path):
+    result = measure("maze 21", lambda: GridState(maze(21)), BucketQueue, repeat=1)
+    assert result.expansions > 0
+    assert result.peak_candidates > 0
+    assert result.peak_memory > 0
+    results = str(tmp_path / "results.json")
+    save(results, [result])
+    loaded = load(results)
+    assert loaded == [result]
+    assert compare(loaded, [result]) == []
+
+    slower = BenchResult(**dict(asdict(result), expansions_per_sec=result.expansions_per_sec / 2))
+    bigger = BenchResult(**dict(asdict(result), peak_memory=result.peak_memory * 2))
+    assert len(compare([result], [slower])) == 1
+    assert len(compare([result], [bigger])) == 1
+    assert compare([slower], [result]) == []
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["compare"]:
+        regressions = compare(load(sys.argv[2]), load(sys.argv[3]))
+        for regression in regressions:
+            print(regression)
+        sys.exit(1 if regressions else 0)
+    else:
+        results = run_all()
+        if len(sys.argv) > 1:
+            save(sys.argv[1], results)
@@ -1,14 +1,58 @@
 # https://adventofcode.com/2018/day/1
 
+from array import array
+import functools
+import io
 import itertools
+import random
 
 import pytest
 
-# Puzzle 1, the one-statement way
-with open("day01_input.txt") as f:
-    result = sum(map(eval, f))
+from util import read_chunks
+
+
+def read_changes(f, chunk_size=1 << 20):
+    """Produce arrays of the signed changes in binary file `f`, a chunk at a time.
+
+    Only one chunk is in memory at a time, so files of any size can be read.
+    """
+    for chunk in read_chunks(f, chunk_size):
+        yield array("q", map(int, chunk.split()))
+
+def iter_changes(filename):
+    """Produce the changes in `filename` one by one, reading it a chunk at a time."""
+    with open(filename, "rb") as f:
+        yield from itertools.chain.from_iterable(read_changes(f))
+
+def load_changes(filename):
+    """Read all the changes in `filename` into an array."""
+    changes = array("q")
+    with open(filename, "rb") as f:
+        for chunk in read_changes(f):
+            changes.extend(chunk)
+    return changes
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 1000])
+def test_read_changes(chunk_size):
+    f = io.BytesIO(b"+19\n-15\n+6\n-123456789012\n+0\n+7")
+    changes = list(itertools.chain.from_iterable(read_changes(f, chunk_size)))
+    assert changes == [19, -15, 6, -123456789012, 0, 7]
 
-print(f"Part 1: The resulting frequency is {result}")
+def test_iter_changes(tmp_path):
+    changes = tmp_path / "changes.txt"
+    changes.write_bytes(b"+1\n-2\n+3\n")
+    assert list(iter_changes(str(changes))) == [1, -2, 3]
+    assert load_changes(str(changes)) == array("q", [1, -2, 3])
+
+
+@functools.lru_cache(maxsize=None)
+def puzzle_input():
+    return load_changes("day01_input.txt")
+
+# Puzzle 1, the one-statement way
+if __name__ == "__main__":
+    result = sum(puzzle_input())
+    print(f"Part 1: The resulting frequency is {result}")
 
 
 def frequencies(changes):
@@ -20,14 +64,12 @@ def frequencies(changes):
         yield freq
 
 # Puzzle 1, using frequencies()
-with open("day01_input.txt") as f:
-    puzzle_input = list(map(eval, f))
-
-for freq in frequencies(puzzle_input):
-    # Ugly way to get the last value in a sequence.
-    pass
+if __name__ == "__main__":
+    for freq in frequencies(puzzle_input()):
+        # Ugly way to get the last value in a sequence.
+        pass
 
-print(f"Part 1 again: The resulting frequency is {freq}")
+    print(f"Part 1 again: The resulting frequency is {freq}")
 
 
 def first_duplicate(seq):
@@ -48,17 +90,93 @@ def test_first_duplicate(seq, dup):
 
 
 def first_dup_frequency(changes):
-    """Find the first duplicated frequency in a repeatedly used list of changes."""
-    return first_duplicate(frequencies(itertools.cycle(changes)))
+    """Find the first duplicated frequency in a repeatedly used list of changes.
+
+    Returns None if there are no changes.
+    """
+    if not changes:
+        # Repeating nothing forever would never end.
+        return None
+    # Iterate `changes` again for each pass: itertools.cycle would copy it.
+    passes = itertools.chain.from_iterable(itertools.repeat(changes))
+    return first_duplicate(frequencies(passes))
 
 @pytest.mark.parametrize("seq, dup", [
     ([+1, -1], 0),
     ([+3, +3, +4, -2, -4], 10),
     ([-6, +3, +8, +5, -6], 5),
     ([+7, +7, -2, -7, -4], 14),
+    ([], None),
 ])
 def test_first_dup_frequency(seq, dup):
     assert first_dup_frequency(seq) == dup
     
 
-print(f"Part 2: the first duplicate frequency is {first_dup_frequency(puzzle_input)}")
+def first_dup_frequency_by_drift(changes):
+    """Find the first duplicated frequency, like first_dup_frequency, but without cycling.
+
+    Each pass through the changes shifts every frequency by the total of the
+    changes, the drift.  So frequency p from the first pass can only meet
+    frequency q later if p and q are in the same residue class modulo the
+    drift, after (q - p) / drift more passes.  Sorting each class along the
+    drift, only neighbors can meet first.  This takes O(n log n) time however
+    many passes it takes to find the duplicate.
+
+    Returns None if no frequency is ever repeated.
+    """
+    # The frequencies before each change in the first pass.
+    starts = []
+    seen = set()
+    freq = 0
+    for ch in changes:
+        if freq in seen:
+            return freq
+        seen.add(freq)
+        starts.append(freq)
+        freq += ch
+    drift = freq
+    if not starts:
+        return None
+    if drift == 0:
+        # The second pass starts over at 0.
+        return 0
+
+    sign = 1 if drift > 0 else -1
+    order = sorted(range(len(starts)), key=lambda i: (starts[i] % drift, starts[i] * sign))
+    first = None
+    for i, j in zip(order, order[1:]):
+        if (starts[j] - starts[i]) % drift == 0:
+            # Frequency i reaches frequency j after this many more passes.
+            passes = (starts[j] - starts[i]) // drift
+            when = passes * len(starts) + i
+            if first is None or when < first[0]:
+                first = (when, starts[j])
+    return first[1] if first else None
+
+@pytest.mark.parametrize("seq, dup", [
+    ([+1, -1], 0),
+    ([+3, +3, +4, -2, -4], 10),
+    ([-6, +3, +8, +5, -6], 5),
+    ([+7, +7, -2, -7, -4], 14),
+    ([+10_000_000, -9_999_999], 10_000_000),
+    ([-10_000_000, +9_999_999], -10_000_000),
+    ([+1], None),
+    ([], None),
+])
+def test_first_dup_frequency_by_drift(seq, dup):
+    assert first_dup_frequency_by_drift(seq) == dup
+
+def test_first_dup_frequency_by_drift_matches():
+    rand = random.Random(1)
+    for _ in range(2000):
+        seq = [rand.randint(-10, 10) for _ in range(rand.randint(1, 8))]
+        dup = first_dup_frequency_by_drift(seq)
+        if dup is not None:
+            assert first_dup_frequency(seq) == dup
+        else:
+            # No duplicates for a good long while, at least.
+            assert first_duplicate(frequencies(seq * 100)) is None
+
+
+if __name__ == "__main__":
+    print(f"Part 2: the first duplicate frequency is {first_dup_frequency(puzzle_input())}")
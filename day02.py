@@ -1,10 +1,20 @@
 # https://adventofcode.com/2018/day/2
 
+from array import array
+import bisect
 import collections
+import itertools
+import multiprocessing
+import os
+import random
 import sys
+import time
 
 import pytest
 
+import day02_geninput
+from util import read_chunks
+
 def puzzle_input():
     with open("day02_input.txt") as f:
         return f.read().splitlines()
@@ -47,6 +57,51 @@ if __name__ == "__main__":
     ans = checksum(puzzle_input())
     print(f"Part 1: the checksum is {ans}")
 
+# Part 1, streaming a huge file through worker processes
+
+def chunk_counts(chunk):
+    """Count the ids in `chunk` with a letter exactly twice, and exactly three times."""
+    num2 = num3 = 0
+    for line in chunk.split():
+        counts = {line.count(c) for c in set(line)}
+        num2 += 2 in counts
+        num3 += 3 in counts
+    return num2, num3
+
+def checksum_file(filename, workers=None, chunk_size=1 << 20):
+    """The checksum of the ids in `filename`, counted in chunks by `workers` processes.
+
+    Only a few chunks per worker are read ahead, so memory stays the same
+    however big the file is.
+    """
+    workers = workers or os.cpu_count()
+    num2 = num3 = 0
+    with open(filename, "rb") as f, multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for chunk in read_chunks(f, chunk_size):
+            pending.append(pool.apply_async(chunk_counts, (chunk,)))
+            while len(pending) > 2 * workers or (pending and pending[0].ready()):
+                n2, n3 = pending.popleft().get()
+                num2 += n2
+                num3 += n3
+        for result in pending:
+            n2, n3 = result.get()
+            num2 += n2
+            num3 += n3
+    return num2 * num3
+
+def test_chunk_counts():
+    assert chunk_counts(b"abcdef\nbababc\nabbcde\nabcccd\naabcdd\nabcdee\nababab\n") == (4, 3)
+
+@pytest.mark.parametrize("workers, chunk_size", [(1, 1000), (2, 7), (3, 1)])
+def test_checksum_file(workers, chunk_size):
+    assert checksum_file("day02_input.txt", workers, chunk_size) == checksum(puzzle_input())
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "checksum":
+        ans = checksum_file(sys.argv[2])
+        print(f"Part 1: the checksum of {sys.argv[2]} is {ans}")
+
 # Part 2, brute force
 
 def equal_but_one(s1, s2):
@@ -118,3 +173,197 @@ if __name__ == "__main__":
     if len(sys.argv) == 2 and sys.argv[1] == "fast":
         ans = common_chars(*find_differ_by_one_fast(puzzle_input()))
         print(f"Part 2: answer is {ans}")
+
+
+# Polynomial hashes of ids are taken with this base, mod the largest 64-bit
+# prime.  A Mersenne prime would be no good: powers of two mod one repeat
+# after a few dozen positions.
+HASH_BASE = 1 << 32
+HASH_MOD = (1 << 64) - 59
+
+def poly_hash(s):
+    """The polynomial hash of `s`: the sum of ord(s[i]) * HASH_BASE**(len(s)-1-i)."""
+    # UTF-32 has each character's ord() as one 32-bit digit.
+    return int.from_bytes(s.encode("utf-32-be"), "big") % HASH_MOD
+
+def pairs_differ_by_one(ids):
+    """Produce all the pairs of ids that differ by one character.
+
+    Each id's polynomial hash is computed once.  Then there's one pass over
+    `ids` for each character position, and taking that character's term out
+    of the hash gives the hash of the id with it left out, in O(1).  Only
+    those hashes and the ids' indexes are kept, so time is O(n·L), memory
+    is O(n), and no blanked copies are made.
+    """
+    length = max((len(s) for s in ids), default=0)
+    hashes = array("Q", map(poly_hash, ids))
+    powers = [pow(HASH_BASE, e, HASH_MOD) for e in range(length)]
+    for pos in range(length):
+        seen = {}       # key is hash without pos, value is index of first id.
+        collided = {}   # key is hash without pos, value is indexes of all ids.
+        keys = [
+            (h - ord(s[pos]) * powers[len(s) - 1 - pos]) % HASH_MOD if len(s) > pos else None
+            for h, s in zip(hashes, ids)
+        ]
+        for i, key in enumerate(keys):
+            if key is None:
+                continue
+            first = seen.setdefault(key, i)
+            if first == i:
+                continue
+            s = ids[i]
+            # Hashes can collide, so check the ids themselves.
+            others = collided.setdefault(key, [first])
+            for j in others:
+                if len(ids[j]) == len(s) and equal_but_one(ids[j], s):
+                    yield ids[j], s
+            others.append(i)
+
+def test_pairs_differ_by_one():
+    assert list(pairs_differ_by_one(test_ids)) == [("fghij", "fguij")]
+    ids = ["abc", "abd", "xbd", "abc", "ab", "b"]
+    assert sorted(pairs_differ_by_one(ids)) == [
+        ("abc", "abd"), ("abd", "abc"), ("abd", "xbd"),
+        ]
+
+def test_poly_hash_positions():
+    # Changing a long id anywhere gives a different hash.
+    s = "a" * 300
+    assert len({poly_hash(s[:i] + "b" + s[i+1:]) for i in range(300)}) == 300
+
+def test_pairs_differ_by_one_matches_brute_force():
+    rand = random.Random(17)
+    ids = ["".join(rand.choice("ab") for _ in range(rand.randint(3, 5))) for _ in range(60)]
+    pairs = {
+        tuple(sorted((s1, s2))) for s1, s2 in itertools.combinations(ids, 2)
+        if len(s1) == len(s2) and equal_but_one(s1, s2)
+        }
+    assert {tuple(sorted(pair)) for pair in pairs_differ_by_one(ids)} == pairs
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "hashed":
+        pair = next(pairs_differ_by_one(puzzle_input()))
+        ans = common_chars(*pair)
+        print(f"Part 2: answer is {ans}")
+
+
+def hamming(s1, s2):
+    """How many positions do equal-length s1 and s2 differ in?"""
+    return sum(c1 != c2 for c1, c2 in zip(s1, s2))
+
+class HammingIndex:
+    """An index of ids, to find the ones within Hamming distance `k` of each other.
+
+    Ids are cut into `parts` segments, k+1 by default.  By the pigeonhole
+    principle, two ids that differ in at most k positions must be the same
+    in at least parts-k of the segments.  Each id is filed in a table for
+    each choice of parts-k segments, ids sharing a key in any table are
+    candidates, and the candidates are checked.  More parts mean more tables,
+    but fewer candidates to check.
+
+    To save memory, the tables are keyed by a hash of the segments rather
+    than the segments themselves, and an id alone under its key is stored
+    as just its index.  Hash collisions only add candidates.
+
+    Ids can be added at any time, and the index queried over and over.
+    """
+    def __init__(self, k=1, ids=(), parts=None):
+        self.k = k
+        self.parts = parts or k + 1
+        if self.parts <= k:
+            raise ValueError(f"Need more than {k} parts, not {self.parts}")
+        self.ids = []
+        self.choices = list(itertools.combinations(range(self.parts), self.parts - k))
+        # One per choice: key is hash of (length, segments), value is the
+        # index of the id, or a list of indexes if there's more than one.
+        self.tables = [{} for _ in self.choices]
+        for s in ids:
+            self.add(s)
+
+    def segments(self, s):
+        """Produce (table, key) for each table s is filed in."""
+        length = len(s)
+        parts = self.parts
+        segs = [s[seg * length // parts:(seg + 1) * length // parts] for seg in range(parts)]
+        for choice, table in zip(self.choices, self.tables):
+            yield table, hash((length, *(segs[seg] for seg in choice)))
+
+    def add(self, s):
+        """Add an id to the index, returning its index."""
+        i = len(self.ids)
+        self.ids.append(s)
+        for table, key in self.segments(s):
+            found = table.setdefault(key, i)
+            if isinstance(found, list):
+                found.append(i)
+            elif found != i:
+                table[key] = [found, i]
+        return i
+
+    def candidates(self, s, below=None):
+        """The indexes of ids sharing at least one segment with s, in order.
+
+        If `below` is given, only indexes less than it are produced.
+        """
+        found = set()
+        for table, key in self.segments(s):
+            indexes = table.get(key, ())
+            if isinstance(indexes, int):
+                indexes = (indexes,)
+            if below is not None:
+                # Indexes are added in order, so the ones below are a prefix.
+                indexes = indexes[:bisect.bisect_left(indexes, below)]
+            found.update(indexes)
+        return sorted(found)
+
+    def query(self, s):
+        """Produce the ids in the index within distance k of s."""
+        for i in self.candidates(s):
+            if hamming(self.ids[i], s) <= self.k:
+                yield self.ids[i]
+
+    def pairs(self):
+        """Produce all the pairs of ids in the index within distance k of each other."""
+        for j, s in enumerate(self.ids):
+            for i in self.candidates(s, below=j):
+                if hamming(self.ids[i], s) <= self.k:
+                    yield self.ids[i], s
+
+def test_hamming_index():
+    index = HammingIndex(1, test_ids)
+    assert list(index.pairs()) == [("fghij", "fguij")]
+    assert list(index.query("fgxij")) == ["fghij", "fguij"]
+    assert list(index.query("zzzzz")) == []
+    index.add("zzzzy")
+    assert list(index.query("zzzzz")) == ["zzzzy"]
+
+@pytest.mark.parametrize("k, parts", [(0, 1), (1, 2), (1, 4), (2, 3), (2, 5), (3, 4)])
+def test_hamming_index_matches_brute_force(k, parts):
+    rand = random.Random(k)
+    ids = ["".join(rand.choice("ab") for _ in range(rand.choice([5, 6]))) for _ in range(60)]
+    expected = [
+        (s1, s2) for j, s2 in enumerate(ids) for s1 in ids[:j]
+        if len(s1) == len(s2) and hamming(s1, s2) <= k
+        ]
+    assert sorted(HammingIndex(k, ids, parts).pairs()) == sorted(expected)
+
+def bench_index(sizes, k=1, parts=8):
+    # Ids of length 40 make enough variants for 10**7 ids.  The generated ids
+    # are all variants of one id, so with only k+1 parts, nearly all of them
+    # share a segment, and checking candidates is quadratic.
+    for size in sizes:
+        ids = list(itertools.islice(day02_geninput.generate(40), size))
+        start = time.perf_counter()
+        index = HammingIndex(k, ids, parts)
+        built = time.perf_counter()
+        pairs = sum(1 for _ in index.pairs())
+        done = time.perf_counter()
+        print(
+            f"{size:>12,d} ids, k={k}, {parts} parts: built in {built-start:.2f}s, "
+            f"{pairs:,d} pairs found in {done-built:.2f}s"
+            )
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        sizes = [int(arg) for arg in sys.argv[2:]] or [10**5, 10**6]
+        bench_index(sizes)
@@ -6,31 +6,33 @@
 # didn't.  This generates me a larger data set.
 
 import itertools
+import math
+import os
 import random
-import string
 import sys
+import tempfile
+
+import pytest
 
 alphabet = "abcdefghijklmnopqrstuvwyz"  # no x
 different = "x"
 
-def change_at(s, pos):
-    other = s[:pos] + different + s[pos+1:]
-    return other
-
-def change_at_many(s, poss):
-    for pos in poss:
-        s = change_at(s, pos)
-    return s
+def generate_lines(length, rand=random):
+    """Produce the words as bytes lines, ending with newlines.
 
-def generate(length):
+    Each changed word is made by setting bytes in a copy of the first word,
+    rather than slicing strings.
+    """
     # Pick a random word.
-    start = "".join(random.choice(alphabet) for _ in range(length))
-    yield start
+    start = bytearray("".join(rand.choice(alphabet) for _ in range(length)) + "\n", "ascii")
+    yield bytes(start)
 
     # Change it in one position.
-    pos1 = random.randint(0, length-1)
-    other = change_at(start, pos1)
-    yield other
+    x = ord(different)
+    pos1 = rand.randint(0, length-1)
+    other = bytearray(start)
+    other[pos1] = x
+    yield bytes(other)
 
     # The other words will be changed in the other positions, at least two of
     # them.
@@ -43,12 +45,81 @@ def generate(length):
     # pair that differs by one character.
     for num_changes in range(2, 10, 2):
         for poss in itertools.combinations(change_places, num_changes):
-            yield change_at_many(start, poss)
+            word = start[:]
+            for pos in poss:
+                word[pos] = x
+            yield bytes(word)
 
-if __name__ == "__main__":
+def generate(length, rand=random):
+    for line in generate_lines(length, rand):
+        yield line[:-1].decode("ascii")
+
+def length_for(number):
+    """The shortest words (at least 20 long) that generate() can make `number` of."""
     length = 20
-    number = int(sys.argv[1])
+    while 2 + sum(math.comb(length-1, n) for n in range(2, 10, 2)) < number:
+        length += 1
+    return length
+
+def write_shuffled(out, lines, number, rand, chunk_size=1_000_000):
+    """Write `lines` to binary file `out` in a random order.
 
-    output = list(itertools.islice(generate(length), number))
-    random.shuffle(output)
-    print("\n".join(output))
+    The lines are dealt at random into temporary files of about `chunk_size`
+    lines each, and then each of those is shuffled in memory and written out,
+    so only one chunk is in memory at a time.
+    """
+    buckets = max(1, math.ceil(number / chunk_size))
+    if buckets == 1:
+        lines = list(lines)
+        rand.shuffle(lines)
+        out.writelines(lines)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [open(os.path.join(tmp, str(b)), "w+b", buffering=1 << 20) for b in range(buckets)]
+        try:
+            for line in lines:
+                files[rand.randrange(buckets)].write(line)
+            for f in files:
+                f.seek(0)
+                chunk = f.readlines()
+                rand.shuffle(chunk)
+                out.writelines(chunk)
+        finally:
+            for f in files:
+                f.close()
+
+def write_ids(out, number, seed=None, chunk_size=1_000_000):
+    """Write `number` shuffled ids to binary file `out`, reproducibly for a given `seed`."""
+    rand = random.Random(seed)
+    # Shuffle with its own generator, so the words don't depend on the chunking.
+    shuffle_rand = random.Random(rand.getrandbits(64))
+    lines = itertools.islice(generate_lines(length_for(number), rand), number)
+    write_shuffled(out, lines, number, shuffle_rand, chunk_size)
+
+@pytest.mark.parametrize("chunk_size", [10, 1_000_000])
+def test_write_ids(tmp_path, chunk_size):
+    def ids(seed):
+        with open(tmp_path / "ids.txt", "w+b") as f:
+            write_ids(f, 200, seed, chunk_size)
+            f.seek(0)
+            return f.read().splitlines()
+    first = ids(17)
+    assert first == ids(17)
+    assert first != ids(18)
+    rand = random.Random(17)
+    rand.getrandbits(64)
+    assert sorted(first) == sorted(line[:-1] for line in itertools.islice(generate_lines(20, rand), 200))
+
+def test_length_for():
+    assert length_for(100) == 20
+    assert len(next(generate(length_for(10**7)))) == length_for(10**7) == 33
+
+if __name__ == "__main__":
+    # day02_geninput.py NUMBER [FILE [SEED]]
+    number = int(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "wb", buffering=1 << 20) as out:
+            write_ids(out, number, seed)
+    else:
+        write_ids(sys.stdout.buffer, number, seed)
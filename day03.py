@@ -1,9 +1,15 @@
 # https://adventofcode.com/2018/day/3
 
+from array import array
 import collections
 from dataclasses import dataclass
+import itertools
+import operator
+import random
 import re
 
+import pytest
+
 @dataclass(frozen=True)
 class Claim:
     id: int
@@ -36,6 +42,68 @@ def puzzle_input():
     with open("day03_input.txt") as f:
         return Claim.parse_all(f.read())
 
+# A line with exactly five numbers, like Claim.parse accepts.
+CLAIM_LINE_RX = re.compile(r"^[^\d\n]*" + r"[^\d\n]+".join([r"(\d+)"] * 5) + r"[^\d\n]*$", re.MULTILINE)
+
+class ClaimColumns:
+    """Claims as columns: arrays of their ids, lefts, tops, widths, and heights.
+
+    The overlap engines read the columns directly.  Claim objects are only
+    made when asked for, by indexing or iterating.
+    """
+    def __init__(self, id=(), left=(), top=(), wide=(), tall=()):
+        self.id = array("i", id)
+        self.left = array("i", left)
+        self.top = array("i", top)
+        self.wide = array("i", wide)
+        self.tall = array("i", tall)
+
+    @classmethod
+    def parse_all(cls, text):
+        """Parse all the claims in `text` at once, with one regex search over it."""
+        nums = array("i", map(int, itertools.chain.from_iterable(CLAIM_LINE_RX.findall(text))))
+        return cls(nums[0::5], nums[1::5], nums[2::5], nums[3::5], nums[4::5])
+
+    @classmethod
+    def from_claims(cls, claims):
+        claims = list(claims)
+        return cls(*([getattr(c, field) for c in claims] for field in ["id", "left", "top", "wide", "tall"]))
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, i):
+        return Claim(self.id[i], self.left[i], self.top[i], self.wide[i], self.tall[i])
+
+    def __iter__(self):
+        return map(Claim, self.id, self.left, self.top, self.wide, self.tall)
+
+    def rects(self):
+        """Produce (left, top, right, bottom) for each claim."""
+        return zip(
+            self.left, self.top,
+            map(operator.add, self.left, self.wide),
+            map(operator.add, self.top, self.tall),
+            )
+
+def as_columns(claims):
+    if isinstance(claims, ClaimColumns):
+        return claims
+    return ClaimColumns.from_claims(claims)
+
+def puzzle_columns():
+    with open("day03_input.txt") as f:
+        return ClaimColumns.parse_all(f.read())
+
+def test_claim_columns():
+    text = TEST_INPUT + "#10 @ 1,2: 3x4 and 5\n#11 @ 1,2: 3\n#12 @ 11,12: 13x14"
+    claims = Claim.parse_all(text)
+    columns = ClaimColumns.parse_all(text)
+    assert list(columns) == claims
+    assert [columns[i] for i in range(len(columns))] == claims
+    assert list(ClaimColumns.from_claims(claims)) == claims
+    assert list(columns.rects())[-1] == (11, 12, 24, 26)
+
 def multiply_covered_squares(claims):
     """Which squares are covered by multiple claims?"""
     # Key is (x,y), value is number of claims.
@@ -92,3 +160,384 @@ if __name__ == "__main__":
     assert len(unlapped) == 1
     ans = unlapped.pop()
     print(f"Part 2: the only claim that doesn't overlap is #{ans.id}")
+
+
+class Fabric:
+    """How many claims cover each square of the fabric, as a dense grid.
+
+    Each claim is four corner updates to a difference array, and running sums
+    along the rows and then down the columns turn that into the number of
+    claims on each square.  Both parts come from that, in time proportional
+    to the number of claims plus the area of the fabric, however much of it
+    the claims cover.
+    """
+    def __init__(self, claims):
+        self.claims = as_columns(claims)
+        rects = list(self.claims.rects())
+        self.width = max((right for _, _, right, _ in rects), default=0)
+        self.height = max((bottom for _, _, _, bottom in rects), default=0)
+        diff = [array("i", bytes(4 * (self.width + 1))) for _ in range(self.height + 1)]
+        for left, top, right, bottom in rects:
+            diff[top][left] += 1
+            diff[top][right] -= 1
+            diff[bottom][left] -= 1
+            diff[bottom][right] += 1
+        # Rows of claim counts, one wider than the fabric, the last always 0.
+        self.rows = []
+        above = array("i", bytes(4 * (self.width + 1)))
+        for row in diff[:-1]:
+            above = array("i", map(operator.add, above, itertools.accumulate(row)))
+            self.rows.append(above)
+
+    def overlapped_area(self):
+        """How many squares are covered by more than one claim?"""
+        return sum(len(row) - row.count(0) - row.count(1) for row in self.rows)
+
+    def unlapped_claims(self):
+        """Which claims don't overlap with any other?"""
+        # A summed-area table of the multiply-covered squares: sat[y][x] is
+        # how many there are above and to the left of (x, y).
+        sat = [array("i", bytes(4 * (self.width + 2)))]
+        for row in self.rows:
+            across = itertools.accumulate(count > 1 for count in row)
+            sat.append(array("i", map(operator.add, sat[-1], itertools.chain([0], across))))
+        ok = set()
+        for i, (left, top, right, bottom) in enumerate(self.claims.rects()):
+            overlapped = sat[bottom][right] - sat[top][right] - sat[bottom][left] + sat[top][left]
+            if overlapped == 0:
+                ok.add(self.claims[i])
+        return ok
+
+def random_claims(n, size, seed=0):
+    rand = random.Random(seed)
+    return [
+        Claim(i, rand.randrange(size), rand.randrange(size), rand.randint(1, size // 4), rand.randint(1, size // 4))
+        for i in range(n)
+        ]
+
+def test_fabric():
+    fabric = Fabric(Claim.parse_all(TEST_INPUT))
+    assert fabric.overlapped_area() == 4
+    assert {c.id for c in fabric.unlapped_claims()} == {3}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fabric_matches(seed):
+    claims = random_claims(30, 40, seed)
+    fabric = Fabric(claims)
+    assert fabric.overlapped_area() == len(multiply_covered_squares(claims))
+    assert fabric.unlapped_claims() == unlapped_claims(claims)
+
+if __name__ == "__main__":
+    fabric = Fabric(puzzle_columns())
+    print(f"Part 1 again, densely: {fabric.overlapped_area()} square inches")
+    print(f"Part 2 again, densely: claim #{fabric.unlapped_claims().pop().id}")
+
+
+class CoverageTree:
+    """A segment tree over the gaps between sorted `ys`, counting cover.
+
+    .add(lo, hi, delta) covers (or uncovers) the gaps from ys[lo] to ys[hi].
+    .covered2() is the total length covered at least twice.
+    """
+    def __init__(self, ys):
+        self.ys = ys
+        size = 4 * max(len(ys), 1)
+        self.cover = [0] * size
+        self.len1 = [0] * size
+        self.len2 = [0] * size
+
+    def add(self, lo, hi, delta, node=1, nlo=0, nhi=None):
+        if nhi is None:
+            nhi = len(self.ys) - 1
+        if hi <= nlo or nhi <= lo:
+            return
+        if lo <= nlo and nhi <= hi:
+            self.cover[node] += delta
+        else:
+            mid = (nlo + nhi) // 2
+            self.add(lo, hi, delta, 2*node, nlo, mid)
+            self.add(lo, hi, delta, 2*node+1, mid, nhi)
+        self.pull(node, nlo, nhi)
+
+    def pull(self, node, nlo, nhi):
+        full = self.ys[nhi] - self.ys[nlo]
+        cover = self.cover[node]
+        if nhi - nlo == 1:
+            kids1 = kids2 = 0
+        else:
+            kids1 = self.len1[2*node] + self.len1[2*node+1]
+            kids2 = self.len2[2*node] + self.len2[2*node+1]
+        if cover >= 2:
+            self.len1[node] = self.len2[node] = full
+        elif cover == 1:
+            self.len1[node] = full
+            self.len2[node] = kids1
+        else:
+            self.len1[node] = kids1
+            self.len2[node] = kids2
+
+    def covered1(self):
+        return self.len1[1]
+
+    def covered2(self):
+        return self.len2[1]
+
+class FenwickTree:
+    """Counts at positions 0..size-1, with O(log n) updates and prefix sums."""
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, pos, delta):
+        pos += 1
+        while pos < len(self.tree):
+            self.tree[pos] += delta
+            pos += pos & -pos
+
+    def prefix(self, pos):
+        """The total of the counts at positions 0..pos."""
+        pos += 1
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+class Spans:
+    """Counts of vertical spans, to find how many cross a given span."""
+    def __init__(self, size):
+        self.tops = FenwickTree(size)
+        self.bottoms = FenwickTree(size)
+        self.count = 0
+
+    def add(self, top, bottom, delta):
+        self.tops.add(top, delta)
+        self.bottoms.add(bottom, delta)
+        self.count += delta
+
+    def crossing(self, top, bottom):
+        """How many spans overlap top..bottom?  Those ending above it or starting below it don't."""
+        above = self.bottoms.prefix(top)
+        below = self.count - self.tops.prefix(bottom - 1)
+        return self.count - above - below
+
+def sweep_claims(claims):
+    """Find the overlapped area, and the claims that don't overlap any other.
+
+    A line sweeps across the fabric, stopping at claims' left and right edges.
+    A segment tree over the claims' distinct top and bottom edges tracks the
+    length of the line covered twice, and Fenwick trees count the claims
+    crossing a span of the line.  This is O(n log n), however big the claims
+    are.
+    """
+    claims = as_columns(claims)
+    rects = list(claims.rects())
+    ys = sorted({top for _, top, _, _ in rects} | {bottom for _, _, _, bottom in rects})
+    yindex = {y: i for i, y in enumerate(ys)}
+    spans = [(yindex[top], yindex[bottom]) for _, top, _, bottom in rects]
+
+    events = []
+    for i, (left, _, right, _) in enumerate(rects):
+        # Claims end before others start at the same x.
+        events.append((left, 1, i))
+        events.append((right, 0, i))
+    events.sort()
+
+    tree = CoverageTree(ys)
+    active = Spans(len(ys))     # The claims crossing the sweep line.
+    started = Spans(len(ys))    # Every claim the line has reached.
+    started_crossing = [0] * len(claims)
+    overlapped = set()
+    area = 0
+    last_x = None
+    for x, starting, i in events:
+        if last_x is not None:
+            area += tree.covered2() * (x - last_x)
+        last_x = x
+        top, bottom = spans[i]
+        if starting:
+            # Claims already on the line overlap this one.
+            if active.crossing(top, bottom):
+                overlapped.add(i)
+            tree.add(top, bottom, 1)
+            active.add(top, bottom, 1)
+            started.add(top, bottom, 1)
+            started_crossing[i] = started.crossing(top, bottom)
+        else:
+            # So do claims that started while this one was on the line.
+            if started.crossing(top, bottom) > started_crossing[i]:
+                overlapped.add(i)
+            tree.add(top, bottom, -1)
+            active.add(top, bottom, -1)
+    unlapped = {claims[i] for i in range(len(claims)) if i not in overlapped}
+    return area, unlapped
+
+def test_sweep_claims():
+    area, unlapped = sweep_claims(Claim.parse_all(TEST_INPUT))
+    assert area == 4
+    assert {c.id for c in unlapped} == {3}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sweep_claims_matches(seed):
+    claims = random_claims(30, 40, seed)
+    fabric = Fabric(claims)
+    assert sweep_claims(claims) == (fabric.overlapped_area(), fabric.unlapped_claims())
+
+def test_sweep_claims_huge():
+    claims = [
+        Claim(1, 0, 0, 10**6, 10**6),
+        Claim(2, 10**6 - 10, 10**6 - 20, 10**6, 10**6),
+        Claim(3, 10**6, 0, 10**6, 10),
+        Claim(4, 3 * 10**6, 3 * 10**6, 1, 1),
+    ]
+    area, unlapped = sweep_claims(claims)
+    assert area == 10 * 20
+    assert {c.id for c in unlapped} == {3, 4}
+
+if __name__ == "__main__":
+    area, unlapped = sweep_claims(puzzle_columns())
+    print(f"Part 1 again, sweeping: {area} square inches")
+    print(f"Part 2 again, sweeping: claim #{unlapped.pop().id}")
+
+
+def covered_areas(rects):
+    """The areas covered at least once, and at least twice, by some rectangles.
+
+    The rectangles are (left, top, right, bottom) tuples.
+    """
+    if not rects:
+        return 0, 0
+    ys = sorted({r[1] for r in rects} | {r[3] for r in rects})
+    yindex = {y: i for i, y in enumerate(ys)}
+    events = []
+    for left, top, right, bottom in rects:
+        events.append((left, 1, yindex[top], yindex[bottom]))
+        events.append((right, -1, yindex[top], yindex[bottom]))
+    events.sort()
+    tree = CoverageTree(ys)
+    once = twice = 0
+    last_x = events[0][0]
+    for x, delta, top, bottom in events:
+        once += tree.covered1() * (x - last_x)
+        twice += tree.covered2() * (x - last_x)
+        last_x = x
+        tree.add(top, bottom, delta)
+    return once, twice
+
+def intersection(c1, c2):
+    """The (left, top, right, bottom) rectangle two claims share, or None."""
+    left = max(c1.left, c2.left)
+    top = max(c1.top, c2.top)
+    right = min(c1.left + c1.wide, c2.left + c2.wide)
+    bottom = min(c1.top + c1.tall, c2.top + c2.tall)
+    if left < right and top < bottom:
+        return left, top, right, bottom
+    return None
+
+class ClaimIndex:
+    """Claims that can be added and removed one at a time.
+
+    Claims are filed in the cells of a uniform grid of `cell`-sized squares,
+    so the claims overlapping a new one are found without looking at all of
+    them.  The overlapped area, and the set of claims overlapping no others,
+    are kept up to date: a change only looks at the claims it overlaps.
+    """
+    def __init__(self, claims=(), cell=64):
+        self.cell = cell
+        self.cells = collections.defaultdict(set)
+        # Key is claim, value is how many other claims it overlaps.
+        self.overlaps = {}
+        self.unlapped = set()
+        self.overlapped_area = 0
+        for claim in claims:
+            self.add(claim)
+
+    def claim_cells(self, claim):
+        cell = self.cell
+        for cx in range(claim.left // cell, (claim.left + claim.wide - 1) // cell + 1):
+            for cy in range(claim.top // cell, (claim.top + claim.tall - 1) // cell + 1):
+                yield cx, cy
+
+    def overlapping(self, claim):
+        """The claims in the index overlapping `claim`, and their shared rectangles."""
+        seen = set()
+        found = []
+        for cell in self.claim_cells(claim):
+            for other in self.cells.get(cell, ()):
+                if other not in seen and other != claim:
+                    seen.add(other)
+                    shared = intersection(claim, other)
+                    if shared:
+                        found.append((other, shared))
+        return found
+
+    def area_change(self, overlapping):
+        """How much does the overlapped area change with a claim over `overlapping`?"""
+        # Squares in the claim covered once by others become covered twice.
+        once, twice = covered_areas([shared for _, shared in overlapping])
+        return once - twice
+
+    def add(self, claim):
+        """Add a claim, returning the claims it overlaps."""
+        if claim in self.overlaps:
+            raise ValueError(f"Claim #{claim.id} is already in the index")
+        overlapping = self.overlapping(claim)
+        self.overlapped_area += self.area_change(overlapping)
+        for other, _ in overlapping:
+            self.overlaps[other] += 1
+            self.unlapped.discard(other)
+        self.overlaps[claim] = len(overlapping)
+        if not overlapping:
+            self.unlapped.add(claim)
+        for cell in self.claim_cells(claim):
+            self.cells[cell].add(claim)
+        return [other for other, _ in overlapping]
+
+    def remove(self, claim):
+        """Remove a claim that was added."""
+        if claim not in self.overlaps:
+            raise ValueError(f"Claim #{claim.id} isn't in the index")
+        for cell in self.claim_cells(claim):
+            self.cells[cell].discard(claim)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        overlapping = self.overlapping(claim)
+        self.overlapped_area -= self.area_change(overlapping)
+        for other, _ in overlapping:
+            self.overlaps[other] -= 1
+            if not self.overlaps[other]:
+                self.unlapped.add(other)
+        del self.overlaps[claim]
+        self.unlapped.discard(claim)
+
+def test_claim_index():
+    claims = Claim.parse_all(TEST_INPUT)
+    index = ClaimIndex(claims[:2], cell=2)
+    assert index.overlapped_area == 4
+    assert index.unlapped == set()
+    assert index.add(claims[2]) == []
+    assert index.unlapped == {claims[2]}
+    index.remove(claims[0])
+    assert index.overlapped_area == 0
+    assert index.unlapped == set(claims[1:])
+    with pytest.raises(ValueError):
+        index.remove(claims[0])
+
+@pytest.mark.parametrize("seed, cell", [(0, 1), (1, 5), (2, 64)])
+def test_claim_index_matches(seed, cell):
+    claims = random_claims(40, 40, seed)
+    rand = random.Random(seed)
+    index = ClaimIndex(cell=cell)
+    present = []
+    for claim in claims:
+        index.add(claim)
+        present.append(claim)
+        if rand.random() < 0.3:
+            index.remove(present.pop(rand.randrange(len(present))))
+        fabric = Fabric(present)
+        assert index.overlapped_area == fabric.overlapped_area()
+        assert index.unlapped == fabric.unlapped_claims()
+
+if __name__ == "__main__":
+    index = ClaimIndex(puzzle_input())
+    print(f"Part 1 again, incrementally: {index.overlapped_area} square inches")
+    print(f"Part 2 again, incrementally: claim #{next(iter(index.unlapped)).id}")
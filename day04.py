@@ -1,7 +1,20 @@
 # https://adventofcode.com/2018/day/4
 
 import collections
+import datetime
+import heapq
+import io
+import itertools
+import os
+import random
 import re
+import sys
+import tempfile
+import time
+
+import pytest
+
+from util import peak_rss
 
 TEST_INPUT = """\
 [1518-11-01 00:00] Guard #10 begins shift
@@ -23,6 +36,8 @@ TEST_INPUT = """\
 [1518-11-05 00:55] wakes up
 """.splitlines()
 
+RECORD_RX = re.compile(r"(?P<day>\d\d-\d\d) \d\d:(?P<minute>\d\d)] (?:Guard #(?P<id>\d+)|(?P<fall>falls)|(?P<wake>wakes))")
+
 def analyze_records(records, show=False):
     # key: guard id, value: counter of minutes
     guards = collections.defaultdict(collections.Counter)
@@ -32,7 +47,7 @@ def analyze_records(records, show=False):
     fell = None             # When did they fall asleep
 
     for record in records:
-        m = re.search(r"(?P<day>\d\d-\d\d) \d\d:(?P<minute>\d\d)] (?:Guard #(?P<id>\d+)|(?P<fall>falls)|(?P<wake>wakes))", record)
+        m = RECORD_RX.search(record)
         if not m:
             print(f"Unexpected input: {record!r}")
             continue
@@ -91,9 +106,56 @@ def part1(records):
 def test_part1():
     assert part1(TEST_INPUT) == (10, 24, 240)
 
+def sorted_lines(f, run_size=1_000_000):
+    """Produce the lines of text file `f` in sorted order, with bounded memory.
+
+    Runs of `run_size` lines are sorted in memory and spilled to temporary
+    files, which are then merged.  Only one run is in memory at a time.
+    Every line produced ends with a newline, even if the file's last line
+    didn't.
+    """
+    runs = []
+    try:
+        while True:
+            run = list(itertools.islice(f, run_size))
+            if not run:
+                break
+            if not run[-1].endswith("\n"):
+                run[-1] += "\n"
+            run.sort()
+            if not runs and len(run) < run_size:
+                # It all fit in one run.
+                yield from run
+                return
+            spill = tempfile.TemporaryFile("w+")
+            runs.append(spill)
+            spill.writelines(run)
+            spill.seek(0)
+        yield from heapq.merge(*runs)
+    finally:
+        for spill in runs:
+            spill.close()
+
+@pytest.mark.parametrize("run_size", [1, 3, 5, 100])
+def test_sorted_lines(run_size):
+    lines = [f"{line}\n" for line in TEST_INPUT]
+    shuffled = lines[:]
+    random.Random(run_size).shuffle(shuffled)
+    assert list(sorted_lines(iter(shuffled), run_size)) == lines
+
+@pytest.mark.parametrize("run_size", [1, 2, 100])
+def test_sorted_lines_unterminated(run_size):
+    # The last line has no newline, and mustn't run into the one after it.
+    lines = ["c\n", "a\n", "b"]
+    assert list(sorted_lines(iter(lines), run_size)) == ["a\n", "b\n", "c\n"]
+
+def read_records(filename, run_size=1_000_000):
+    """Produce the records in `filename` in time order."""
+    with open(filename) as f:
+        yield from sorted_lines(f, run_size)
+
 def puzzle_input():
-    with open("day04_input.txt") as f:
-        return sorted(f.readlines())
+    return read_records("day04_input.txt")
 
 chars = ".123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
@@ -133,3 +195,109 @@ def test_part2():
 if __name__ == "__main__":
     gid, minute_most_asleep, ans = part2(puzzle_input())
     print(f"Part 2: Most consistent guard is {gid}, sleeping at minute {minute_most_asleep}: the answer is {ans}")
+
+
+# The Gregorian calendar repeats every 400 years, which is this many days.
+CYCLE_DAYS = 146097
+
+def log_date(days, year_width=4):
+    """The date `days` days after 1518-01-01, as a string.
+
+    Years after 9999 are fine, and are zero-padded to `year_width` digits, so
+    dates still sort as strings.
+    """
+    cycles, days = divmod(days, CYCLE_DAYS)
+    date = datetime.date(1518, 1, 1) + datetime.timedelta(days=days)
+    return f"{date.year + 400 * cycles:0{year_width}d}-{date.month:02d}-{date.day:02d}"
+
+def test_log_date():
+    assert log_date(0) == "1518-01-01"
+    assert log_date(-1) == "1517-12-31"
+    assert log_date(365) == "1519-01-01"
+    assert log_date(CYCLE_DAYS) == "1918-01-01"
+    days = [0, CYCLE_DAYS - 1, CYCLE_DAYS, 3_100_000, 10_000_000]
+    dates = [log_date(d, 5) for d in days]
+    assert dates == sorted(dates)
+    assert dates[-1] > "27000"
+
+def generate_log(records, seed=0):
+    """Produce about `records` lines of a guard log, in time order.
+
+    Each day a random guard starts a shift and naps a few times.  The log
+    starts in 1518, and runs for as many years as it takes, past 9999 if
+    need be.
+    """
+    rand = random.Random(seed)
+    gids = [rand.randint(10, 3500) for _ in range(50)]
+    # Every day has at least one record, so this is wide enough for any year.
+    year_width = max(4, len(str(1518 + records // 365 + 1)))
+    day = 0
+    made = 0
+    while made < records:
+        gid = rand.choice(gids)
+        date = log_date(day, year_width)
+        if rand.random() < 0.5:
+            yield f"[{log_date(day - 1, year_width)} 23:{rand.randint(45, 59):02d}] Guard #{gid} begins shift\n"
+        else:
+            yield f"[{date} 00:{rand.randint(0, 5):02d}] Guard #{gid} begins shift\n"
+        made += 1
+        naps = sorted(rand.sample(range(6, 60), 2 * rand.randint(0, 3)))
+        for fell, wake in zip(naps[::2], naps[1::2]):
+            yield f"[{date} 00:{fell:02d}] falls asleep\n"
+            yield f"[{date} 00:{wake:02d}] wakes up\n"
+            made += 2
+        day += 1
+
+def scatter_log(out, lines, records, rand, chunk_size=1_000_000):
+    """Write about `records` `lines` to text file `out`, in a random order.
+
+    The lines are dealt at random into temporary files of about `chunk_size`
+    lines each, and then each of those is shuffled in memory and written out,
+    so only one chunk is in memory at a time, but every chunk has lines from
+    all through the log.
+    """
+    chunks = max(1, -(-records // chunk_size))
+    files = [tempfile.TemporaryFile("w+") for _ in range(chunks)]
+    try:
+        for line in lines:
+            files[rand.randrange(chunks)].write(line)
+        for f in files:
+            f.seek(0)
+            chunk = f.readlines()
+            rand.shuffle(chunk)
+            out.writelines(chunk)
+    finally:
+        for f in files:
+            f.close()
+
+def test_generate_log():
+    log = list(generate_log(1000))
+    assert log == sorted(log)
+    guards = analyze_records(log)
+    out = io.StringIO()
+    scatter_log(out, iter(log), len(log), random.Random(1), 100)
+    shuffled = out.getvalue().splitlines(keepends=True)
+    assert sorted(shuffled) == log
+    # The runs the sort spills overlap, so merging them really interleaves.
+    first_run = sorted(shuffled[:100])
+    assert first_run[0] < log[100] and first_run[-1] > log[-100]
+    assert analyze_records(sorted_lines(iter(shuffled), 100)) == guards
+
+def bench_pipeline(records, run_size=1_000_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "log.txt")
+        with open(log, "w", buffering=1 << 20) as out:
+            scatter_log(out, generate_log(records), records, random.Random(1), run_size)
+        start = time.perf_counter()
+        guards = analyze_records(read_records(log, run_size))
+        gid, minutes = most_minutes_asleep(guards)
+        elapsed = time.perf_counter() - start
+    print(
+        f"{records:,d} records: sorted and analyzed in {elapsed:.1f}s, "
+        f"{records/elapsed:,.0f}/s, peak RSS {peak_rss()/1e6:.1f}Mb; "
+        f"guard {gid} slept {minutes:,d} minutes"
+        )
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        bench_pipeline(int(sys.argv[2]) if len(sys.argv) > 2 else 10**7)
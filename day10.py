@@ -65,6 +65,7 @@ def results(input_name):
     message_sky.print()
     print(f"It took {seconds} seconds!")
 
-results("day10_test_input.txt")
-print()
-results("day10_input.txt")
+if __name__ == "__main__":
+    results("day10_test_input.txt")
+    print()
+    results("day10_input.txt")
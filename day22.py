@@ -1,33 +1,95 @@
 # https://adventofcode.com/2018/day/22
 
-import itertools
+from array import array
+
+import pytest
+
+TILE_BITS = 6
+TILE_SIZE = 1 << TILE_BITS
+TILE_MASK = TILE_SIZE - 1
 
 class Cave:
+    """The cave's regions, computed a tile at a time as they are needed.
+
+    Tiles are TILE_SIZE regions square.  Each one is computed row by row from
+    the bottom row of the tile above it and the right column of the tile to
+    its left, so nothing recurses, and memory grows by a tile at a time.
+    """
     def __init__(self, depth, tx, ty):
         self.depth = depth
         self.tx = tx
         self.ty = ty
-        self.regions = {}
-        self.erosion_level(0, 0)
+        # (tile x, tile y) -> erosion levels, and risk levels, row by row.
+        self.erosion_tiles = {}
+        self.risk_tiles = {}
 
-    def erosion_level(self, x, y):
-        if (x, y) not in self.regions:
-            if (x, y) == (0, 0):
-                gindex = 0
-            elif (x, y) == (self.tx, self.ty):
-                gindex = 0
-            elif x == 0:
-                gindex = y * 48271
-            elif y == 0:
-                gindex = x * 16807
+    def computed_regions(self):
+        """How many regions have been computed so far."""
+        return len(self.erosion_tiles) * TILE_SIZE * TILE_SIZE
+
+    def tile(self, i, j):
+        """Compute tile (i, j), and any tiles it depends on."""
+        # A tile needs every tile above and to the left of it.
+        for b in range(j+1):
+            for a in range(i+1):
+                if (a, b) not in self.erosion_tiles:
+                    self.compute_tile(a, b)
+        return self.risk_tiles[i, j]
+
+    def compute_tile(self, i, j):
+        depth = self.depth
+        x0 = i * TILE_SIZE
+        y0 = j * TILE_SIZE
+        xs = range(x0, x0 + TILE_SIZE)
+        left_tile = self.erosion_tiles[i-1, j] if i > 0 else None
+        if j > 0:
+            above = self.erosion_tiles[i, j-1][-TILE_SIZE:].tolist()
+        levels = array("H")
+        for y in range(y0, y0 + TILE_SIZE):
+            if y == 0:
+                row = [(x * 16807 + depth) % 20183 for x in xs]
             else:
-                gindex = self.erosion_level(x-1, y) * self.erosion_level(x, y-1)
-            level = (gindex + self.depth) % 20183
-            self.regions[x, y] = level
-        return self.regions[x, y]
+                if left_tile is None:
+                    # The left edge of the cave.
+                    left = (y * 48271 + depth) % 20183
+                    row = [left]
+                    ups = above[1:]
+                else:
+                    left = left_tile[(y - y0) * TILE_SIZE + TILE_MASK]
+                    row = []
+                    ups = above
+                for up in ups:
+                    left = (left * up + depth) % 20183
+                    row.append(left)
+            if y == self.ty and x0 <= self.tx < x0 + TILE_SIZE:
+                # The target's geologic index is 0, which changes the rest of the row.
+                k = self.tx - x0
+                left = row[k] = depth % 20183
+                if y > 0:
+                    # On the top row, the rest doesn't depend on the target.
+                    for k in range(k + 1, TILE_SIZE):
+                        left = row[k] = (left * above[k] + depth) % 20183
+            levels.extend(row)
+            above = row
+        self.erosion_tiles[i, j] = levels
+        self.risk_tiles[i, j] = bytes([level % 3 for level in levels])
+
+    def fill(self, width, height):
+        """Compute all the regions in a `width` by `height` rectangle at the mouth."""
+        self.tile((width - 1) >> TILE_BITS, (height - 1) >> TILE_BITS)
+
+    def erosion_level(self, x, y):
+        tile = self.erosion_tiles.get((x >> TILE_BITS, y >> TILE_BITS))
+        if tile is None:
+            self.tile(x >> TILE_BITS, y >> TILE_BITS)
+            tile = self.erosion_tiles[x >> TILE_BITS, y >> TILE_BITS]
+        return tile[(y & TILE_MASK) << TILE_BITS | (x & TILE_MASK)]
 
     def risk_level(self, x, y):
-        return self.erosion_level(x, y) % 3
+        tile = self.risk_tiles.get((x >> TILE_BITS, y >> TILE_BITS))
+        if tile is None:
+            tile = self.tile(x >> TILE_BITS, y >> TILE_BITS)
+        return tile[(y & TILE_MASK) << TILE_BITS | (x & TILE_MASK)]
 
     def print(self):
         for y in range(self.ty+1):
@@ -41,20 +103,67 @@ class Cave:
             print()
 
     def area_risk_level(self):
-        return sum(self.risk_level(x, y) for x, y in itertools.product(range(self.tx+1), range(self.ty+1)))
+        width, height = self.tx + 1, self.ty + 1
+        self.fill(width, height)
+        total = 0
+        for y in range(height):
+            j, row = divmod(y, TILE_SIZE)
+            for i in range((width + TILE_MASK) >> TILE_BITS):
+                tile = self.risk_tiles[i, j]
+                start = row * TILE_SIZE
+                total += sum(tile[start:start + min(TILE_SIZE, width - i * TILE_SIZE)])
+        return total
 
 def test_it():
     test_cave = Cave(510, 10, 10)
     test_cave.print()
     assert test_cave.area_risk_level() == 114
 
+@pytest.mark.parametrize("depth, tx, ty", [(510, 10, 10), (4080, 14, 785), (11739, 70, 3), (510, 130, 70), (510, 10, 0), (510, 70, 0)])
+def test_tiles(depth, tx, ty):
+    # Compare with the rule applied directly to a whole rectangle.
+    cave = Cave(depth, tx, ty)
+    width, height = 2 * TILE_SIZE + 5, ty + TILE_SIZE
+    levels = {}
+    for y in range(height):
+        for x in range(width):
+            if (x, y) == (tx, ty):
+                gindex = 0
+            elif y == 0:
+                gindex = x * 16807
+            elif x == 0:
+                gindex = y * 48271
+            else:
+                gindex = levels[x-1, y] * levels[x, y-1]
+            levels[x, y] = (gindex + depth) % 20183
+    # Probe far corners first, so tiles get computed out of order.
+    for x, y in reversed(list(levels)):
+        assert cave.erosion_level(x, y) == levels[x, y]
+        assert cave.risk_level(x, y) == levels[x, y] % 3
+    area = sum(levels[x, y] % 3 for x in range(tx+1) for y in range(ty+1))
+    assert Cave(depth, tx, ty).area_risk_level() == area
+
 if __name__ == "__main__":
     cave = Cave(4080, 14, 785)
     risk = cave.area_risk_level()
     print(f"Part 1: total risk level is {risk}")
 
 
-from astar import State, search
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from astar import (
+    AStar, BidirectionalAStar, BucketQueue, IDAStar, PackedAStar,
+    PackedProblem, ParallelAStar, PriorityQueue, SMAStar, State, search,
+    search_bidirectional, search_ida, search_packed, search_parallel,
+    search_path,
+)
+from util import peak_rss
 
 
 def neighbors(x, y):
@@ -79,6 +188,14 @@ def is_valid_tool(tool, region_type):
         assert region_type == NARROW
         return tool in (TORCH, NEITHER)
 
+# Transition tables, indexed by region type and tool index.  A tool can't be
+# used in the region type with the same index, so each region type allows two
+# tools, and switching tools there always means switching to the other one.
+TOOL_INDEX = {tool: index for index, tool in enumerate(TOOLS)}
+ALLOWED_TOOLS = [sum(1 << t for t in range(3) if t != r) for r in range(3)]
+SWITCH_TOOL = [[3 - r - t if t != r else None for t in range(3)] for r in range(3)]
+SWITCH_TOOL_NAME = [[TOOLS[t] if t is not None else None for t in switches] for switches in SWITCH_TOOL]
+
 MOVE_COST = 1
 TOOL_COST = 7
 
@@ -110,31 +227,400 @@ class CaveState(State):
     def summary(self):
         return (
             f"at {(self.x, self.y)} with {self.tool}, "
-            f"cave has {len(self.cave.regions):,d} regions"
+            f"cave has {self.cave.computed_regions():,d} regions"
             )
 
+    def fingerprint(self):
+        cave = self.cave
+        return (cave.depth, cave.tx, cave.ty, self.x, self.y, self.tool)
+
+    def goal_state(self):
+        return self.__class__(self.cave, self.cave.tx, self.cave.ty, TORCH)
+
+    def guess_start_cost(self, start):
+        moving_cost = abs(self.x - start.x) + abs(self.y - start.y)
+        tool_cost = 0 if self.tool == start.tool else TOOL_COST
+        return moving_cost + tool_cost
+
+    def prev_states(self, cost):
+        # Moves and tool changes can be undone at the same cost.
+        return self.next_states(cost)
+
     def next_states(self, cost):
+        cave = self.cave
+        x, y, tool = self.x, self.y, self.tool
+        tool_bit = 1 << TOOL_INDEX[tool]
         # Maybe we can move, takes 1 minute
-        for nx, ny in neighbors(self.x, self.y):
-            there = self.cave.risk_level(nx, ny)
-            if is_valid_tool(self.tool, there):
-                nstate = self.__class__(self.cave, nx, ny, self.tool)
-                yield nstate, cost + MOVE_COST
+        for nx, ny in neighbors(x, y):
+            if ALLOWED_TOOLS[cave.risk_level(nx, ny)] & tool_bit:
+                yield self.__class__(cave, nx, ny, tool), cost + MOVE_COST
 
         # Maybe we can change our tool, takes 7 minutes
+        ntool = SWITCH_TOOL_NAME[cave.risk_level(x, y)][TOOL_INDEX[tool]]
+        yield self.__class__(cave, x, y, ntool), cost + TOOL_COST
+
+def settle_tools(best, valid):
+    """Given minutes to a region with each tool, account for switching tools there."""
+    cheapest = min(best)
+    return [min(b, cheapest + TOOL_COST) if v else float('inf') for b, v in zip(best, valid)]
+
+def downward_minutes(cave):
+    """The fewest minutes to reach the target on paths that never move up.
+
+    Paths stay within 2*tx+2 columns.  This is quick to compute, and the best
+    path can't take longer.
+    """
+    inf = float('inf')
+    width = 2 * cave.tx + 2
+    above = None
+    for y in range(cave.ty+1):
+        valid = [[is_valid_tool(tool, cave.risk_level(x, y)) for tool in TOOLS] for x in range(width)]
+        if y == 0:
+            row = [[inf] * 3 for _ in range(width)]
+            row[0] = settle_tools([0 if tool == TORCH else inf for tool in TOOLS], valid[0])
+        else:
+            row = [
+                settle_tools([a + MOVE_COST if v else inf for a, v in zip(up, val)], val)
+                for up, val in zip(above, valid)
+            ]
+        # Sweep right, then left, to find the best sideways moves in this row.
+        for xs in [range(1, width), range(width-2, -1, -1)]:
+            for x in xs:
+                prev = row[x-1] if xs.step == 1 else row[x+1]
+                row[x] = settle_tools(
+                    [min(here, p + MOVE_COST) if v else inf for here, p, v in zip(row[x], prev, valid[x])],
+                    valid[x],
+                    )
+        above = row
+    return above[cave.tx][TOOLS.index(TORCH)]
+
+class PackedCave(PackedProblem):
+    """The part 2 search with states packed into ints: (y*width + x)*3 + tool.
+
+    The cave is only `width` regions wide.  Getting to column x and then to
+    the target takes at least 2*x - tx + ty minutes, so the width is chosen
+    to leave out only columns that no path faster than downward_minutes()
+    can reach.
+    """
+    def __init__(self, cave):
+        self.cave = cave
+        most = downward_minutes(cave)
+        self.width = max(cave.tx + 2, (most + cave.tx - cave.ty) // 2 + 2)
+        self.goal = self.pack(cave.tx, cave.ty, TOOLS.index(TORCH))
+
+    def pack(self, x, y, tool):
+        return (y * self.width + x) * 3 + tool
+
+    def unpack(self, state):
+        pos, tool = divmod(state, 3)
+        y, x = divmod(pos, self.width)
+        return x, y, tool
+
+    def start(self):
+        return self.pack(0, 0, TOOLS.index(TORCH))
+
+    def is_goal(self, state):
+        return state == self.goal
+
+    def guess_completion_cost(self, state):
+        x, y, tool = self.unpack(state)
+        moving_cost = abs(self.cave.tx - x) + abs(self.cave.ty - y)
+        tool_cost = 0 if TOOLS[tool] == TORCH else TOOL_COST
+        return moving_cost + tool_cost
+
+    def summary(self, state):
+        x, y, tool = self.unpack(state)
+        return (
+            f"at {(x, y)} with {TOOLS[tool]}, "
+            f"cave has {self.cave.computed_regions():,d} regions"
+            )
+
+    def next_states(self, state, cost):
+        pos, tool = divmod(state, 3)
+        y, x = divmod(pos, self.width)
+        risk_level = self.cave.risk_level
+        row = 3 * self.width
+        move_cost = cost + MOVE_COST
+        # A tool can't be used in the region type with the same index.
+        if x > 0 and risk_level(x-1, y) != tool:
+            yield state - 3, move_cost
+        if y > 0 and risk_level(x, y-1) != tool:
+            yield state - row, move_cost
+        if x + 1 < self.width and risk_level(x+1, y) != tool:
+            yield state + 3, move_cost
+        if risk_level(x, y+1) != tool:
+            yield state + row, move_cost
+        yield state - tool + SWITCH_TOOL[risk_level(x, y)][tool], cost + TOOL_COST
+
+def test_transition_tables():
+    for region_type in [ROCKY, WET, NARROW]:
         for tool in TOOLS:
-            if tool != self.tool:
-                here = self.cave.risk_level(self.x, self.y)
-                if is_valid_tool(tool, here):
-                    nstate = self.__class__(self.cave, self.x, self.y, tool)
-                    yield nstate, cost + TOOL_COST
+            t = TOOL_INDEX[tool]
+            assert bool(ALLOWED_TOOLS[region_type] >> t & 1) == is_valid_tool(tool, region_type)
+            assert (region_type != t) == is_valid_tool(tool, region_type)
+            if is_valid_tool(tool, region_type):
+                other = SWITCH_TOOL_NAME[region_type][t]
+                assert other != tool and is_valid_tool(other, region_type)
+                assert SWITCH_TOOL[region_type][t] == TOOL_INDEX[other]
 
 def test_search():
     test_cave = Cave(510, 10, 10)
-    time = search(CaveState(test_cave), log=1)
-    assert time == 45
+    minutes = search(CaveState(test_cave), log=1)
+    assert minutes == 45
 
-if __name__ == "__main__":
+@pytest.mark.parametrize("queue_class", [PriorityQueue, BucketQueue])
+def test_search_queues(queue_class):
+    test_cave = Cave(510, 10, 10)
+    assert search(CaveState(test_cave), queue_class=queue_class) == 45
+
+def test_search_path():
+    test_cave = Cave(510, 10, 10)
+    minutes, path = search_path(CaveState(test_cave))
+    path = list(path)[::-1]
+    assert path[0] == CaveState(test_cave)
+    assert path[-1].is_goal()
+    # Each step is a legal move, and the steps add up to the total time.
+    total = 0
+    for here, there in zip(path, path[1:]):
+        total = dict(here.next_states(total))[there]
+    assert total == minutes == 45
+
+@pytest.mark.parametrize("depth, tx, ty", [
+    (510, 10, 10),
+    (4080, 14, 60),
+    (11739, 11, 35),
+])
+def test_search_bidirectional(depth, tx, ty):
+    cave = Cave(depth, tx, ty)
+    assert search_bidirectional(CaveState(cave)) == search(CaveState(cave))
+
+def test_search_stats():
+    stats = []
+    minutes = search(CaveState(Cave(4080, 14, 100)), log=.001, on_stats=stats.append)
+    assert minutes == 150
+    assert stats[-1].done
+    assert stats[-1].expansions > 0
+    samples = stats[:-1]
+    assert samples
+    assert all(not s.done and s.cost is not None for s in samples)
+    assert all(0 <= s.f_growth for s in samples)
+
+def test_search_stats_in_thread():
+    # Away from the main thread, stats can't come from a signal.
+    stats = []
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(search(CaveState(Cave(4080, 14, 100)), log=.001, on_stats=stats.append))
+    )
+    thread.start()
+    thread.join()
+    assert results == [150]
+    assert stats[-1].done
+    assert any(not s.done and s.cost is not None for s in stats)
+
+def test_search_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "search.ckpt")
+    astar = AStar()
+    astar.start(CaveState(Cave(4080, 14, 100)))
+    assert astar.run(checkpoint=checkpoint, run_for=.01) is None
+    part_way = astar.expansions()
+    assert 0 < part_way
+    resumed = AStar.resume(checkpoint)
+    assert resumed.expansions() == part_way
+    assert resumed.run() == 150
+    assert resumed.expansions() > part_way
+    # The path crosses the checkpoint.
+    path = list(resumed.path())
+    assert path[-1] == CaveState(Cave(4080, 14, 100))
+    assert path[0].is_goal()
+
+def test_search_resumes(tmp_path):
+    checkpoint = str(tmp_path / "search.ckpt")
+    astar = AStar()
+    astar.start(CaveState(Cave(4080, 14, 100)))
+    assert astar.run(checkpoint=checkpoint, run_for=.01) is None
+    # A checkpoint is only for the search it came from.
+    with pytest.raises(ValueError, match="different start state"):
+        search(CaveState(Cave(510, 10, 10)), checkpoint=checkpoint)
+    assert search(CaveState(Cave(4080, 14, 100)), checkpoint=checkpoint) == 150
+    # Once the search is done, its checkpoint is too.
+    assert not os.path.exists(checkpoint)
+    assert search(CaveState(Cave(510, 10, 10)), checkpoint=checkpoint) == 45
+
+@pytest.mark.parametrize("max_states", [300, 100_000])
+def test_search_ida(max_states):
+    assert search_ida(CaveState(Cave(510, 10, 10)), max_states) == 45
+    assert search_ida(CaveState(Cave(4080, 14, 20)), max_states) == 38
+
+class CountingSMAStar(SMAStar):
+    most_states = 0
+
+    def add_state(self, *args):
+        super().add_state(*args)
+        self.most_states = max(self.most_states, len(self.costs))
+
+@pytest.mark.parametrize("depth, tx, ty, max_states", [
+    (510, 10, 10, 150),
+    (510, 10, 10, 1000),
+    (4080, 14, 30, 300),
+    (11739, 11, 35, 200),
+])
+def test_search_sma(depth, tx, ty, max_states):
+    cave = Cave(depth, tx, ty)
+    sma = CountingSMAStar(max_states)
+    assert sma.search(CaveState(cave)) == search(CaveState(cave))
+    # One state over, until the worst leaf is forgotten.
+    assert sma.most_states <= max_states + 1
+
+def test_search_packed():
+    test_cave = Cave(510, 10, 10)
+    assert search_packed(PackedCave(test_cave)) == 45
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_search_parallel(workers):
+    assert search_parallel(PackedCave(Cave(510, 10, 10)), workers) == 45
+    assert search_parallel(PackedCave(Cave(4080, 14, 100)), workers) == 150
+
+class BrokenCave(PackedCave):
+    def next_states(self, state, cost):
+        raise ValueError("Oops")
+
+def test_search_parallel_failure():
+    with pytest.raises(Exception, match="worker failed"):
+        search_parallel(BrokenCave(Cave(510, 10, 10)), 2)
+
+def test_search_packed_path():
+    packed = PackedCave(Cave(510, 10, 10))
+    astar = PackedAStar()
+    assert astar.search(packed) == 45
+    path = list(astar.path())
+    assert path[0] == packed.goal
+    assert path[-1] == packed.start()
+
+def test_downward_minutes():
+    # Never moving up is slower than the best path.
+    assert downward_minutes(Cave(510, 10, 10)) == 55
+    assert downward_minutes(Cave(4080, 14, 100)) >= 150
+
+def bench_searches():
+    searches = [
+        ("PriorityQueue", lambda cave: search(CaveState(cave), queue_class=PriorityQueue)),
+        ("BucketQueue", lambda cave: search(CaveState(cave), queue_class=BucketQueue)),
+        ("Packed", lambda cave: search_packed(PackedCave(cave))),
+    ]
+    for name, searcher in searches:
+        start = time.perf_counter()
+        minutes = searcher(Cave(4080, 14, 785))
+        elapsed = time.perf_counter() - start
+        # Run again to measure memory, since tracing slows things down.
+        tracemalloc.start()
+        searcher(Cave(4080, 14, 785))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:>14s}: {minutes} minutes, found in {elapsed:.2f}s, peak memory {peak/1e6:.1f}Mb")
+
+def bench_bidirectional():
+    for search_class in [AStar, BidirectionalAStar]:
+        cave = Cave(4080, 14, 785)
+        searcher = search_class()
+        start = time.perf_counter()
+        minutes = searcher.search(CaveState(cave))
+        elapsed = time.perf_counter() - start
+        visited = searcher.expansions()
+        print(f"{search_class.__name__:>18s}: {minutes} minutes, found in {elapsed:.2f}s, {visited:,d} states visited")
+
+def bench_parallel():
+    cave = Cave(4080, 14, 785)
+    start = time.perf_counter()
+    minutes = search_packed(PackedCave(cave))
+    elapsed = time.perf_counter() - start
+    print(f"Serial packed: {minutes} minutes, found in {elapsed:.2f}s")
+    for workers in [1, 2, 4, 8]:
+        searcher = ParallelAStar(workers)
+        start = time.perf_counter()
+        minutes = searcher.search(PackedCave(Cave(4080, 14, 785)))
+        elapsed = time.perf_counter() - start
+        expansions = sum(searcher.expansions)
+        print(
+            f"{workers} workers: {minutes} minutes, found in {elapsed:.2f}s, "
+            f"{expansions:,d} expansions, {expansions/elapsed:,.0f}/s"
+            )
+
+def measured(searcher, results):
+    start = time.perf_counter()
+    answer = searcher()
+    elapsed = time.perf_counter() - start
+    results.put((answer, elapsed, peak_rss()))
+
+def run_measured(searcher):
+    """Run `searcher()` in a new process, returning (answer, seconds, peak RSS in bytes)."""
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    proc = ctx.Process(target=measured, args=(searcher, results))
+    proc.start()
+    answer = results.get()
+    proc.join()
+    return answer
+
+def bench_memory():
+    # IDA* re-expands too much for the real cave, so it only runs on a shallower one.
+    shallow = (4080, 14, 100)
+    real = (4080, 14, 785)
+    searches = [
+        ("AStar", shallow, lambda cave: AStar().search(CaveState(cave))),
+        ("IDAStar(1e6)", shallow, lambda cave: IDAStar(1_000_000).search(CaveState(cave))),
+        ("IDAStar(1e4)", shallow, lambda cave: IDAStar(10_000).search(CaveState(cave))),
+        ("SMAStar(3500)", shallow, lambda cave: SMAStar(3500).search(CaveState(cave))),
+        ("AStar", real, lambda cave: AStar().search(CaveState(cave))),
+        ("SMAStar(150k)", real, lambda cave: SMAStar(150_000).search(CaveState(cave))),
+    ]
+    for name, cave_args, searcher in searches:
+        minutes, elapsed, peak_rss = run_measured(lambda: searcher(Cave(*cave_args)))
+        print(f"{name:>14s} on {cave_args}: {minutes} minutes, found in {elapsed:.2f}s, peak RSS {peak_rss/1e6:.1f}Mb")
+
+def bench_area():
+    for tx, ty in [(14, 785), (1000, 5000)]:
+        start = time.perf_counter()
+        risk = Cave(4080, tx, ty).area_risk_level()
+        elapsed = time.perf_counter() - start
+        print(f"Area risk level to {(tx, ty)}: {risk}, in {elapsed*1000:.1f}ms")
+
+def bench_checkpoint():
     cave = Cave(4080, 14, 785)
-    time = search(CaveState(cave), log=.1)
-    print(f"Part 2: fewest minutes to reach target is {time}")
+    astar = AStar(keep_path=False)
+    astar.start(CaveState(cave))
+    astar.run(run_for=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = os.path.join(tmp, "search.ckpt")
+        start = time.perf_counter()
+        astar.save(checkpoint)
+        saved = time.perf_counter()
+        minutes = AStar.resume(checkpoint).run()
+        resumed = time.perf_counter()
+        print(
+            f"Checkpoint after {astar.expansions():,d} states: "
+            f"{os.path.getsize(checkpoint)/1e6:.1f}Mb saved in {saved-start:.2f}s, "
+            f"resumed and finished in {resumed-saved:.2f}s, {minutes} minutes"
+            )
+
+def bench_stats():
+    for log in [0, 1, .01]:
+        cave = Cave(4080, 14, 785)
+        start = time.perf_counter()
+        search(CaveState(cave), log=log, on_stats=lambda stats: None)
+        elapsed = time.perf_counter() - start
+        print(f"Sampling stats every {log}s: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "bench":
+        bench_area()
+        bench_searches()
+        bench_bidirectional()
+        bench_stats()
+        bench_checkpoint()
+        bench_parallel()
+        bench_memory()
+    else:
+        cave = Cave(4080, 14, 785)
+        minutes = search(CaveState(cave), log=.1)
+        print(f"Part 2: fewest minutes to reach target is {minutes}")
@@ -0,0 +1,54 @@
+"""Time how long it takes to import each module.
+
+    python import_bench.py
+
+Modules should only define things when imported, and do their work under
+`if __name__ == "__main__":`, so importing one for its tests or functions
+takes milliseconds.  Each module is imported in a fresh process, after
+pytest, which nearly all of them import, so its time isn't counted.
+"""
+
+import glob
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TIME_IMPORT = """\
+import time
+import pytest
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+def modules():
+    names = glob.glob(os.path.join(HERE, "day*.py")) + [os.path.join(HERE, "astar.py")]
+    return sorted(os.path.splitext(os.path.basename(name))[0] for name in names)
+
+def import_seconds(module):
+    """How long it takes to import `module` in a new process."""
+    proc = subprocess.run(
+        [sys.executable, "-c", TIME_IMPORT.format(module=module)],
+        capture_output=True, text=True, check=True, cwd=HERE,
+        )
+    # Anything the module printed comes before the time.
+    return float(proc.stdout.splitlines()[-1])
+
+def test_imports_are_quiet():
+    # Importing modules shouldn't run the puzzles.
+    imports = "".join(f"import {module}\n" for module in modules())
+    proc = subprocess.run(
+        [sys.executable, "-c", imports],
+        capture_output=True, text=True, check=True, cwd=HERE,
+        )
+    assert proc.stdout == ""
+
+if __name__ == "__main__":
+    total = 0
+    for module in modules():
+        seconds = import_seconds(module)
+        total += seconds
+        print(f"{module:>16s}: {seconds*1000:6.1f}ms")
+    print(f"{'total':>16s}: {total*1000:6.1f}ms")
@@ -0,0 +1,39 @@
+"""Helpers used by more than one day."""
+
+import io
+import resource
+
+import pytest
+
+
+def read_chunks(f, chunk_size=1 << 20):
+    """Produce chunks of whole lines from binary file `f`, about `chunk_size` bytes each.
+
+    Only one chunk is in memory at a time, so files of any size can be read.
+    The last chunk might not end with a newline.
+    """
+    rest = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        # Don't split a line between chunks.
+        cut = chunk.rfind(b"\n") + 1
+        rest = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+    if rest.strip():
+        yield rest
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 1000])
+def test_read_chunks(chunk_size):
+    chunks = list(read_chunks(io.BytesIO(b"one\ntwo\n\nthree"), chunk_size))
+    assert b"".join(chunks) == b"one\ntwo\n\nthree"
+    assert all(chunk.endswith(b"\n") for chunk in chunks[:-1])
+
+
+def peak_rss():
+    """The most memory this process has had resident, in bytes."""
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024